@@ -0,0 +1,84 @@
+"""
+Hover hit-testing cost against the count of shapes.
+
+Compare the spatial index lookup used by the reader (ShapeIndex.shape_at)
+with the linear scan over every shape done before. The shapes are buttons
+laid out on a grid, the cursor positions are random. The index cost should
+stay flat from 10 to 5000 shapes while the scan grows linearly.
+
+    python benchmarks/bench_hover.py
+
+A Qt binding is required.
+"""
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    from hotbox_designer.vendor.Qt import QtCore
+except ImportError:
+    sys.exit('A Qt binding is required to run the hover benchmark.')
+
+from hotbox_designer.spatial import ShapeIndex  # noqa: E402
+
+
+SHAPE_COUNTS = 10, 100, 500, 1000, 5000
+BUTTON_SIZE = 24
+SPACING = 4
+CURSOR_COUNT = 1000
+REPEAT = 5
+
+
+class RectShape():
+    def __init__(self, rect):
+        self.rect = rect
+
+
+def get_grid_shapes(count):
+    columns = int(count ** 0.5) + 1
+    step = BUTTON_SIZE + SPACING
+    return [
+        RectShape(QtCore.QRectF(
+            (i % columns) * step, (i // columns) * step,
+            BUTTON_SIZE, BUTTON_SIZE))
+        for i in range(count)]
+
+
+def linear_shape_at(shapes, cursor):
+    # hover test done before the index: every shape is tested
+    hovered = None
+    for shape in shapes:
+        if shape.rect.contains(cursor):
+            hovered = shape
+    return hovered
+
+
+def measure(function, cursors):
+    # best time per lookup, in microseconds
+    timer = timeit.Timer(lambda: [function(cursor) for cursor in cursors])
+    return min(timer.repeat(REPEAT, 1)) / len(cursors) * 1e6
+
+
+def main():
+    random.seed(0)
+    print('{:>6} {:>12} {:>12}'.format('shapes', 'index (us)', 'linear (us)'))
+    for count in SHAPE_COUNTS:
+        shapes = get_grid_shapes(count)
+        index = ShapeIndex(shapes)
+        size = (int(count ** 0.5) + 1) * (BUTTON_SIZE + SPACING)
+        cursors = [
+            QtCore.QPoint(random.randint(0, size), random.randint(0, size))
+            for _ in range(CURSOR_COUNT)]
+        for cursor in cursors:
+            assert index.shape_at(cursor) is linear_shape_at(shapes, cursor)
+        indexed = measure(index.shape_at, cursors)
+        linear = measure(lambda c: linear_shape_at(shapes, c), cursors)
+        print('{:>6} {:>12.2f} {:>12.2f}'.format(count, indexed, linear))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Shape painting cost per frame.
+
+Paint the shapes of a bundled template in an offscreen image, with the
+render recipes kept between frames (the reader behaviour) and with the
+recipes rebuilt on each frame (every pen, brush, color and font created
+again, as draw_shape did before the recipes). The time per frame and the
+memory allocated by python during a frame are printed.
+
+    python benchmarks/bench_paint.py [template.json]
+
+A Qt binding is required, the offscreen platform is used by default.
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+try:
+    from hotbox_designer.vendor.Qt import QtGui, QtWidgets
+except ImportError:
+    sys.exit('A Qt binding is required to run the paint benchmark.')
+
+from hotbox_designer.data import ensure_old_data_compatible  # noqa: E402
+from hotbox_designer.interactive import Shape  # noqa: E402
+from hotbox_designer.painting import draw_shape  # noqa: E402
+
+
+TEMPLATE = os.path.join(
+    ROOT, 'hotbox_designer', 'resources', 'templates', 'human.json')
+FRAMES = 200
+REPEAT = 5
+
+
+def load_shapes(filename):
+    with open(filename, 'r') as f:
+        hotbox_data = ensure_old_data_compatible(json.load(f))
+    settings = hotbox_data['general']
+    shapes = [Shape(options) for options in hotbox_data['shapes']]
+    return shapes, settings['width'], settings['height']
+
+
+def paint_frame(image, shapes, rebuild_recipes=False):
+    painter = QtGui.QPainter(image)
+    for shape in shapes:
+        if rebuild_recipes:
+            shape.invalidate()
+        draw_shape(painter, shape)
+    painter.end()
+
+
+def measure(image, shapes, rebuild_recipes):
+    """ return the best time in ms and the python memory peak in KB """
+    def paint():
+        paint_frame(image, shapes, rebuild_recipes)
+    paint()
+    timer = timeit.Timer(paint)
+    duration = min(timer.repeat(REPEAT, FRAMES)) / FRAMES * 1e3
+    tracemalloc.start()
+    paint()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak / 1024.0
+
+
+def main():
+    application = QtWidgets.QApplication.instance()
+    if application is None:
+        application = QtWidgets.QApplication(sys.argv[:1])
+    filename = sys.argv[1] if len(sys.argv) > 1 else TEMPLATE
+    shapes, width, height = load_shapes(filename)
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32)
+    print('{} shapes, {} frames'.format(len(shapes), FRAMES))
+    print('{:>18} {:>10} {:>14}'.format('', 'ms/frame', 'python KB'))
+    for label, rebuild in (('cached recipes', False), ('rebuilt', True)):
+        duration, peak = measure(image, shapes, rebuild)
+        print('{:>18} {:>10.3f} {:>14.1f}'.format(label, duration, peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Hotbox file size and save/load cost of the storage encodings.
+
+Compare the full format (every option of every shape, written with an
+indentation as the hotboxes were saved before) with the compact version 2
+encoding (shapes stored as deltas from their template, no indentation).
+The save covers the encoding and the serialization, the load covers the
+parsing and the expansion to the full options.
+
+    python benchmarks/bench_storage.py [hotbox.json ...]
+
+The bundled templates are measured when no file is given.
+"""
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    from hotbox_designer.data import (
+        encode_hotbox_data, ensure_old_data_compatible)
+except ImportError:
+    sys.exit('A Qt binding is required to import hotbox_designer.')
+
+
+TEMPLATES = os.path.join(ROOT, 'hotbox_designer', 'resources', 'templates')
+NUMBER = 50
+REPEAT = 5
+
+
+def save_full(data):
+    return json.dumps(data, indent=2)
+
+
+def save_compact(data):
+    return json.dumps(encode_hotbox_data(data), separators=(',', ':'))
+
+
+def load(text):
+    # both formats are read by the same loader
+    return ensure_old_data_compatible(json.loads(text))
+
+
+def measure(function, argument):
+    # best time per call, in milliseconds
+    timer = timeit.Timer(lambda: function(argument))
+    return min(timer.repeat(REPEAT, NUMBER)) / NUMBER * 1e3
+
+
+def main():
+    filenames = sys.argv[1:] or [
+        os.path.join(TEMPLATES, f) for f in sorted(os.listdir(TEMPLATES))]
+    print('{:>16} {:>8} {:>10} {:>10} {:>10}'.format(
+        '', 'format', 'bytes', 'save (ms)', 'load (ms)'))
+    for filename in filenames:
+        with open(filename, 'r') as f:
+            data = ensure_old_data_compatible(json.load(f))
+        name = os.path.basename(filename)
+        for label, save in (('full', save_full), ('v2', save_compact)):
+            text = save(data)
+            save_duration = measure(save, data)
+            load_duration = measure(load, text)
+            print('{:>16} {:>8} {:>10} {:>10.3f} {:>10.3f}'.format(
+                name, label, len(text.encode('utf-8')),
+                save_duration, load_duration))
+            name = ''
+
+
+if __name__ == '__main__':
+    main()
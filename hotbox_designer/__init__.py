@@ -2,5 +2,12 @@ import os
 import json
 from hotbox_designer.reader import HotboxWidget
 from hotbox_designer.data import load_templates, load_json
-from hotbox_designer.manager import (
-    launch_manager, initialize, show, hide, switch, load_hotboxes)
\ No newline at end of file
+from hotbox_designer.runtime import (
+    initialize, show, hide, switch, load_hotboxes)
+
+
+def launch_manager(application):
+    # the manager and the designer are imported only when they are needed,
+    # the hotkeys commands only need the runtime modules.
+    from hotbox_designer.manager import launch_manager
+    launch_manager(application)
@@ -1,13 +1,17 @@
 import os
 import json
 from hotbox_designer.vendor.Qt import QtWidgets
-from hotbox_designer.dialog import warning
 from hotbox_designer.languages import (
     MEL, PYTHON, NUKE_TCL, NUKE_EXPRESSION, HSCRIPT, RUMBA_SCRIPT)
+from hotbox_designer.data import load_hotboxes_datas, STORAGE_SINGLE_FILE
 
 
 HOTBOXES_FILENAME = 'hotboxes.json'
 SHARED_HOTBOXES_FILENAME = 'shared_hotboxes.json'
+SHARED_HOTBOXES_MIRROR_FOLDER = 'shared_hotboxes_mirror'
+# set to data.STORAGE_PER_HOTBOX to save each personal hotbox in its own file,
+# the existing hotboxes are migrated on the next save.
+HOTBOXES_STORAGE = STORAGE_SINGLE_FILE
 SETMODE_PRESS_RELEASE = 'open on press | close on release'
 SETMODE_SWITCH_ON_PRESS = 'switch on press'
 
@@ -22,7 +26,10 @@ class AbstractApplication(object):
         self.name = type(self).__name__
         folder = self.get_data_folder()
         self.local_file = os.path.join(folder, HOTBOXES_FILENAME)
+        self.local_storage = HOTBOXES_STORAGE
         self.shared_file = os.path.join(folder, SHARED_HOTBOXES_FILENAME)
+        self.shared_mirror_folder = os.path.join(
+            folder, SHARED_HOTBOXES_MIRROR_FOLDER)
         self.main_window = self.get_main_window()
         self.reader_parent = self.get_reader_parent()
         self.available_languages = self.get_available_languages()
@@ -98,6 +105,7 @@ class Maya(AbstractApplication):
     def set_hotkey(
             self, name, mode, sequence, open_cmd, close_cmd, switch_cmd):
         from maya import cmds, mel
+        from hotbox_designer.dialog import warning
         current_hotkey_set = cmds.hotkeySet(current=True, query=True)
         if current_hotkey_set == 'Maya_Default':
             msg = (
@@ -293,12 +301,10 @@ class Rumba(AbstractApplication):
         return hotkey_file
 
     def load_hotboxes(self):
-        hotboxes_file = self.get_hotboxes_file()
-        if not os.path.exists(hotboxes_file):
-            return []
-        with open(hotboxes_file, 'r') as f:
-            return json.load(f)
-        
+        # read through the data module, the hotboxes can be stored in one
+        # file per hotbox.
+        return load_hotboxes_datas(self.local_file, self.local_storage)
+
     def load_hotkey(self):
         hotkey_file = self.get_hotkey_file()
         if not os.path.exists(hotkey_file):
@@ -0,0 +1,125 @@
+import os
+import json
+import atexit
+import hashlib
+import traceback
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from hotbox_designer.vendor.Qt import QtCore
+from hotbox_designer.data import write_text_atomic
+
+
+# quiet period in milliseconds before the scheduled save is written
+AUTOSAVE_DELAY = 1000
+# the schedulers alive, their pending save is written at the exit. The set
+# doesn't keep them (and their snapshot owner) alive.
+_schedulers = weakref.WeakSet()
+
+
+class SaveScheduler(QtCore.QObject):
+    """
+    Coalesce the save requests into one write after a quiet period. The
+    get_snapshot callable returns the (filename, data) to write, it's
+    called on the GUI thread when the save is flushed and must return
+    copies the interface won't modify. The serialization and the writing
+    are done by a single worker thread, so the writes are done in request
+    order. A file whose content didn't change since the last write is not
+    rewritten and a file given with None as data is removed. The pending
+    save is written when the interpreter exits.
+    """
+    saved = QtCore.Signal()
+
+    def __init__(self, get_snapshot, delay=AUTOSAVE_DELAY, parent=None):
+        super(SaveScheduler, self).__init__(parent)
+        self.get_snapshot = get_snapshot
+        self.pending = False
+        self._hashes = {}
+        self._datas = {}
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+        self._timer.timeout.connect(self.flush)
+        _schedulers.add(self)
+
+    def schedule(self):
+        # each request restarts the timer
+        self.pending = True
+        self._timer.start()
+
+    def flush(self, wait=False):
+        self._timer.stop()
+        self.pending = False
+        future = self._executor.submit(self._save, self.get_snapshot())
+        if wait:
+            future.result()
+
+    def flush_on_exit(self):
+        # the worker doesn't accept jobs anymore when the interpreter exits,
+        # the last save is written from the current thread.
+        _schedulers.discard(self)
+        self._executor.shutdown(wait=True)
+        if not self.pending:
+            return
+        self.pending = False
+        try:
+            # the host application may already have destroyed the Qt
+            # objects giving the data.
+            snapshot = self.get_snapshot()
+        except Exception:
+            traceback.print_exc()
+            return
+        self._write(snapshot)
+
+    def _save(self, snapshot):
+        # executed by the worker, the connected slots are called by the
+        # GUI thread event loop.
+        if self._write(snapshot):
+            self.saved.emit()
+
+    def _write(self, snapshot):
+        """
+        write the files of the snapshot in order, then remove the files
+        given with None as data. The writing stops on the first error and
+        nothing is removed: a file is only deleted once its replacements
+        (the other layout files or the manifest) are on disk.
+        """
+        written = False
+        for filename, data in snapshot:
+            if data is None:
+                continue
+            try:
+                # comparing the data is cheaper than serializing it
+                if self._datas.get(filename) == data:
+                    continue
+                text = json.dumps(data, separators=(',', ':'))
+                digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+                if self._hashes.get(filename) != digest:
+                    write_text_atomic(filename, text)
+                    written = True
+                # the last written state is only recorded once it's on disk,
+                # a failed write is retried by the next save.
+                self._hashes[filename] = digest
+                self._datas[filename] = data
+            except Exception:
+                traceback.print_exc()
+                return written
+        for filename, data in snapshot:
+            if data is not None:
+                continue
+            try:
+                if os.path.exists(filename):
+                    os.remove(filename)
+                self._hashes.pop(filename, None)
+                self._datas.pop(filename, None)
+            except Exception:
+                traceback.print_exc()
+        return written
+
+
+def flush_schedulers():
+    for scheduler in list(_schedulers):
+        scheduler.flush_on_exit()
+
+
+atexit.register(flush_schedulers)
@@ -0,0 +1,125 @@
+"""
+Geometry functions working on many rects at once. The rects are converted
+to coordinates arrays (left, top, right, bottom) processed with numpy when
+it's available, else with pure python lists. The per rect functions of the
+geometry module stay faster for few rects, BATCH_THRESHOLD is the count
+from which the callers switch to this module.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+BATCH_THRESHOLD = 64
+
+
+def get_rects_coords(rects):
+    coords = [(r.left(), r.top(), r.right(), r.bottom()) for r in rects]
+    if numpy is None:
+        return coords
+    return numpy.array(coords, dtype=float).reshape(-1, 4)
+
+
+def set_rects_coords(rects, coords):
+    for rect, (left, top, right, bottom) in zip(rects, coords):
+        rect.setCoords(left, top, right, bottom)
+
+
+def remap_coords(coords, in_reference_rect, out_reference_rect):
+    """
+    batch version of geometry.resize_rect_with_reference: return the coords
+    scaled from the in reference rect to the out reference rect.
+    """
+    in_left = in_reference_rect.left()
+    in_top = in_reference_rect.top()
+    out_left = out_reference_rect.left()
+    out_top = out_reference_rect.top()
+    x_factor = (
+        (out_reference_rect.right() - out_left) /
+        (in_reference_rect.right() - in_left))
+    y_factor = (
+        (out_reference_rect.bottom() - out_top) /
+        (in_reference_rect.bottom() - in_top))
+
+    if numpy is None:
+        return [(
+            out_left + (left - in_left) * x_factor,
+            out_top + (top - in_top) * y_factor,
+            out_left + (right - in_left) * x_factor,
+            out_top + (bottom - in_top) * y_factor)
+            for left, top, right, bottom in coords]
+
+    origins = numpy.array([in_left, in_top, in_left, in_top])
+    factors = numpy.array([x_factor, y_factor, x_factor, y_factor])
+    offsets = numpy.array([out_left, out_top, out_left, out_top])
+    return offsets + (coords - origins) * factors
+
+
+def get_coords_bounds(coords):
+    """ return the (left, top, right, bottom) bounds of all the coords """
+    if numpy is None:
+        lefts, tops, rights, bottoms = zip(*coords)
+        return min(lefts), min(tops), max(rights), max(bottoms)
+    return (
+        coords[:, 0].min(), coords[:, 1].min(),
+        coords[:, 2].max(), coords[:, 3].max())
+
+
+def segment_cross_coords(p1, p2, coords):
+    """
+    batch version of geometry.segment_cross_rect: return for each rect if
+    one of its sides is crossed by the segment p1 p2.
+    """
+    x1, y1, x2, y2 = p1.x(), p1.y(), p2.x(), p2.y()
+    if numpy is None:
+        return [
+            _segment_cross_rect_coords(x1, y1, x2, y2, *c) for c in coords]
+
+    lefts, tops = coords[:, 0], coords[:, 1]
+    rights, bottoms = coords[:, 2], coords[:, 3]
+    sides = (
+        (lefts, tops, rights, tops),
+        (rights, tops, rights, bottoms),
+        (rights, bottoms, lefts, bottoms),
+        (lefts, bottoms, lefts, tops))
+    result = numpy.zeros(len(coords), dtype=bool)
+    for x3, y3, x4, y4 in sides:
+        result |= _segments_cross_arrays(x1, y1, x2, y2, x3, y3, x4, y4)
+    return result
+
+
+def _segment_cross_rect_coords(x1, y1, x2, y2, left, top, right, bottom):
+    return (
+        _segment_cross_segment(x1, y1, x2, y2, left, top, right, top) or
+        _segment_cross_segment(x1, y1, x2, y2, right, top, right, bottom) or
+        _segment_cross_segment(x1, y1, x2, y2, right, bottom, left, bottom) or
+        _segment_cross_segment(x1, y1, x2, y2, left, bottom, left, top))
+
+
+def _segment_cross_segment(x1, y1, x2, y2, x3, y3, x4, y4):
+    # same computation than geometry.segment_cross_segment on coordinates
+    dx1, dy1 = x2 - x1, y2 - y1
+    dx2, dy2 = x4 - x3, y4 - y3
+    dx3, dy3 = x1 - x3, y1 - y3
+    d = dx1 * dy2 - dy1 * dx2
+    if d == 0:
+        return False
+    t1 = (dx2 * dy3 - dy2 * dx3) / d
+    if t1 < 0 or t1 > 1:
+        return False
+    t2 = (dx1 * dy3 - dy1 * dx3) / d
+    return 0 <= t2 <= 1
+
+
+def _segments_cross_arrays(x1, y1, x2, y2, x3, y3, x4, y4):
+    dx1, dy1 = x2 - x1, y2 - y1
+    dx2, dy2 = x4 - x3, y4 - y3
+    dx3, dy3 = x1 - x3, y1 - y3
+    d = dx1 * dy2 - dy1 * dx2
+    valid = d != 0
+    # parallel sides are never crossed, avoid the division by zero
+    d = numpy.where(valid, d, 1)
+    t1 = (dx2 * dy3 - dy2 * dx3) / d
+    t2 = (dx1 * dy3 - dy1 * dx3) / d
+    return valid & (t1 >= 0) & (t1 <= 1) & (t2 >= 0) & (t2 <= 1)
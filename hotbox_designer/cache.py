@@ -0,0 +1,214 @@
+import os
+from collections import OrderedDict
+from hotbox_designer.vendor.Qt import QtCore, QtGui
+from hotbox_designer.painting import get_shape_state, render_shape_sprite
+
+
+SPRITE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+PIXMAP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+IMAGE_DECODING_THREADS = 4
+
+
+class LRUCache():
+    """
+    Least recently used cache with a memory budget. Each entry is stored
+    with its cost in bytes and the oldest entries are dropped when the
+    total cost exceed the budget.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def insert(self, key, value, cost):
+        self.remove(key)
+        if cost > self.max_bytes:
+            return
+        self.entries[key] = value, cost
+        self.bytes += cost
+        self.fit(self.max_bytes)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def fit(self, max_bytes):
+        self.max_bytes = max_bytes
+        while self.bytes > self.max_bytes:
+            _, (_, cost) = self.entries.popitem(last=False)
+            self.bytes -= cost
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SpriteCache():
+    """
+    Cache of the interactive shapes rasterized for each of their state.
+    A sprite is rendered on the first paint of a shape in a state then only
+    blit. The key is the shape appearance options, so identical buttons
+    share the same sprites.
+    """
+    def __init__(self, max_bytes=None):
+        self.cache = LRUCache(max_bytes or SPRITE_CACHE_MAX_BYTES)
+
+    def draw(self, painter, shape):
+        state = get_shape_state(shape)
+        ratio = painter.device().devicePixelRatioF()
+        key = shape.signature(), state, ratio
+        sprite = self.cache.get(key)
+        if sprite is None:
+            sprite = render_shape_sprite(shape, state, ratio)
+            self.cache.insert(key, sprite, get_pixmap_cost(sprite))
+        painter.drawPixmap(shape.bounding_rect().topLeft(), sprite)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class PixmapCache(QtCore.QObject):
+    """
+    Cache of the images files loaded as pixmap, shared by all the shapes of
+    all the hotboxes. An image used by several buttons is only decoded once.
+    The key contains the file modification time, an image edited on disk is
+    loaded again.
+    The images can be requested asynchronously: they are decoded in a
+    thread pool, converted to pixmap in the gui thread, then the
+    pixmapLoaded signal is emitted with the image key. Only the shapes
+    waiting for this key have to be updated.
+    """
+    pixmapLoaded = QtCore.Signal(object)
+    _imageDecoded = QtCore.Signal(object, object)
+
+    def __init__(self, max_bytes=None, parent=None):
+        super(PixmapCache, self).__init__(parent)
+        self.cache = LRUCache(max_bytes or PIXMAP_CACHE_MAX_BYTES)
+        self.pending = set()
+        # pixmap decoded but too big for the budget, only kept while the
+        # waiting shapes are notified.
+        self.uncached = {}
+        self.thread_pool = QtCore.QThreadPool()
+        self.thread_pool.setMaxThreadCount(IMAGE_DECODING_THREADS)
+        self._imageDecoded.connect(self._image_decoded)
+
+    @property
+    def hits(self):
+        return self.cache.hits
+
+    @property
+    def misses(self):
+        return self.cache.misses
+
+    def get(self, path, size=None):
+        """
+        return the pixmap of the image file. If a size is given, the image
+        is decoded at this size.
+        """
+        key = get_image_key(path, size)
+        pixmap = self.cache.get(key)
+        if pixmap is None:
+            pixmap = QtGui.QPixmap.fromImage(read_image(path, size))
+            self.cache.insert(key, pixmap, get_pixmap_cost(pixmap))
+        return pixmap
+
+    def request(self, path, size=None):
+        """
+        return the image key and the pixmap if it's already loaded.
+        Otherwise, schedule its decoding and return the key and None, the
+        pixmapLoaded signal is emitted with this key once it's decoded.
+        """
+        key = get_image_key(path, size)
+        if key in self.uncached:
+            return key, self.uncached[key]
+        pixmap = self.cache.get(key)
+        if pixmap is not None or key in self.pending:
+            return key, pixmap
+        self.pending.add(key)
+        decoder = ImageDecoder(key, path, size, self._imageDecoded)
+        self.thread_pool.start(decoder)
+        return key, None
+
+    def _image_decoded(self, key, image):
+        self.pending.discard(key)
+        pixmap = QtGui.QPixmap.fromImage(image)
+        self.cache.insert(key, pixmap, get_pixmap_cost(pixmap))
+        if key in self.cache:
+            self.pixmapLoaded.emit(key)
+            return
+        # the pixmap doesn't fit in the cache, it's given to the shapes
+        # requesting it during the signal. Otherwise, they would request a
+        # new decoding in loop.
+        self.uncached[key] = pixmap
+        try:
+            self.pixmapLoaded.emit(key)
+        finally:
+            del self.uncached[key]
+
+    def set_max_bytes(self, max_bytes):
+        self.cache.fit(max_bytes)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ImageDecoder(QtCore.QRunnable):
+    """
+    Decode an image in a worker thread. QImage is thread safe, the
+    conversion to QPixmap is done when the signal reach the gui thread.
+    """
+    def __init__(self, key, path, size, signal):
+        super(ImageDecoder, self).__init__()
+        self.key = key
+        self.path = path
+        self.size = size
+        self.signal = signal
+
+    def run(self):
+        self.signal.emit(self.key, read_image(self.path, self.size))
+
+
+def read_image(path, size=None):
+    """
+    decode the image file. If a size is given, the image is directly decoded
+    at this size instead of the full resolution, when the format allows it.
+    """
+    reader = QtGui.QImageReader(path)
+    if size is not None:
+        reader.setScaledSize(size)
+    return reader.read()
+
+
+def get_image_key(path, size=None):
+    path = os.path.realpath(path) if path else path
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    size = (size.width(), size.height()) if size is not None else None
+    return path, size, mtime
+
+
+def get_pixmap_cost(pixmap):
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+pixmap_cache = PixmapCache()
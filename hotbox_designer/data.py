@@ -1,17 +1,42 @@
 
 import os
+import re
 import json
-from hotbox_designer.templates import HOTBOX
+import time
+import hashlib
+import threading
+import traceback
+from collections import deque
+from functools import partial
+from hotbox_designer.templates import HOTBOX, SHAPE_TEMPLATES_V2
 
 
 DEFAULT_NAME = 'MyHotbox_{}'
+SHARED_HOTBOXES_LOADING_THREADS = 8
+# maximum time in seconds waited for the shared hotbox files
+SHARED_HOTBOXES_LOADING_TIMEOUT = 5.0
 TRIGGERING_TYPES = 'click only', 'click or close'
+EXECUTION_TYPES = 'immediate', 'deferred'
+# layouts of the personal hotboxes on disk: all the hotboxes in one json
+# list or one file per hotbox listed by a manifest in a folder named like
+# the single file (hotboxes.json -> hotboxes/manifest.json).
+STORAGE_SINGLE_FILE = 'single file'
+STORAGE_PER_HOTBOX = 'per hotbox'
+MANIFEST_FILENAME = 'manifest.json'
+# version of the compact hotbox encoding (see encode_hotbox_data). The
+# files without version contain the full shapes options.
+DATA_VERSION = 2
+# base shape templates of each encoding version, the shapes are decoded
+# with the templates of the version they were saved with.
+SHAPE_TEMPLATES = {2: SHAPE_TEMPLATES_V2}
 HOTBOX_REPRESENTATION = """\
 <b>Name </b>{name}<br>
 <b>Submenu </b>{submenu}<br>
 <b>Triggering </b>{triggering}<br>
+<b>Execution </b>{execution}<br>
 <b>Aiming </b>{aiming}<br>
 <b>Close on leave </b>{leaveclose}<br>
+<b>Sprite cache </b>{spritecache}<br>
 """
 
 
@@ -36,11 +61,98 @@ def get_valid_name(hotboxes, proposal=None):
     return name
 
 
-def load_hotboxes_datas(filename):
-    datas = load_json(filename, default=[])
+def load_hotboxes_datas(filename, storage=STORAGE_SINGLE_FILE):
+    datas = read_hotboxes_datas(filename, storage)
     return [ensure_old_data_compatible(data) for data in datas]
 
 
+def read_hotboxes_datas(filename, storage=STORAGE_SINGLE_FILE):
+    """
+    read the hotboxes from the layout used by the storage. If it doesn't
+    exist yet, the other layout is read: the next save migrates the
+    hotboxes to the layout expected.
+    """
+    folder = get_hotboxes_folder(filename)
+    manifest = load_json(os.path.join(folder, MANIFEST_FILENAME))
+    if manifest is None:
+        return load_json(filename, default=[])
+    if storage == STORAGE_SINGLE_FILE and os.path.exists(filename):
+        return load_json(filename, default=[])
+    datas = [
+        load_json(os.path.join(folder, basename))
+        for basename in get_manifest_basenames(manifest)]
+    return [data for data in datas if data is not None]
+
+
+def get_manifest_basenames(manifest):
+    # the manifest only lists files of its folder and never itself.
+    basenames = [os.path.basename(b) for b in manifest['hotboxes']]
+    return [b for b in basenames if b.lower() != MANIFEST_FILENAME]
+
+
+def get_hotboxes_folder(filename):
+    return os.path.splitext(filename)[0]
+
+
+def get_hotboxes_files(filename, hotboxes_datas, storage=STORAGE_SINGLE_FILE):
+    """
+    return the (filename, data) to write to save the hotboxes in the
+    storage layout, in writing order. A None data means that file has to
+    be removed: these are the files of the other layout and the files
+    of the hotboxes renamed or deleted, they are only removed once all
+    the files are written (see autosave.SaveScheduler). The manifest is
+    written after the hotboxes files, it never lists a file not written yet.
+    """
+    folder = get_hotboxes_folder(filename)
+    manifest = os.path.join(folder, MANIFEST_FILENAME)
+    # only the files listed by the manifest were written by a previous
+    # save, the other files of the folder are never touched.
+    manifest_data = load_json(manifest)
+    existing = [
+        os.path.join(folder, basename)
+        for basename in get_manifest_basenames(manifest_data)
+    ] if manifest_data is not None else []
+
+    if storage == STORAGE_SINGLE_FILE:
+        datas = [encode_hotbox_data(data) for data in hotboxes_datas]
+        files = [(filename, datas)]
+        if manifest_data is not None:
+            files.append((manifest, None))
+        return files + [(f, None) for f in existing]
+
+    hotboxes_datas = [encode_hotbox_data(data) for data in hotboxes_datas]
+    basenames = get_hotboxes_basenames(hotboxes_datas)
+    files = [
+        (os.path.join(folder, basename), data)
+        for basename, data in zip(basenames, hotboxes_datas)]
+    files.append((manifest, {'hotboxes': basenames}))
+    # lower case comparison, to not delete a file written on a case
+    # insensitive file system.
+    written = set(f.lower() for f, _ in files)
+    files += [(f, None) for f in existing if f.lower() not in written]
+    if os.path.exists(filename):
+        files.append((filename, None))
+    return files
+
+
+def get_hotboxes_basenames(hotboxes_datas):
+    basenames = []
+    # the manifest filename is reserved, a hotbox named 'manifest' would be
+    # overwritten by it.
+    used = set([MANIFEST_FILENAME])
+    for data in hotboxes_datas:
+        name = re.sub(r'[^\w\-]', '_', data['general']['name'])
+        basename = name + '.json'
+        index = 0
+        # names differing only by special characters would share a file.
+        while basename.lower() in used:
+            basename = '{}_{}.json'.format(name, str(index).zfill(2))
+            index += 1
+        basenames.append(basename)
+        used.add(basename.lower())
+    return basenames
+
+
 def load_json(filename, default=None):
     if not os.path.exists(filename):
         return default
@@ -48,9 +160,145 @@ def load_json(filename, default=None):
         return json.load(f)
 
 
-def save_datas(filename, hotboxes_data):
-    with open(filename, 'w') as f:
-        json.dump(hotboxes_data, f, indent=2)
+def load_shared_hotboxes_datas(
+        filenames, timeout=SHARED_HOTBOXES_LOADING_TIMEOUT,
+        threads=SHARED_HOTBOXES_LOADING_THREADS, mirror_folder=None):
+    """
+    read the shared hotbox files in daemon threads, that's mostly waiting
+    for the file server. The datas are returned in the filenames order.
+    If a mirror folder is given, the local copies are returned right away
+    and the threads refresh them in background for the next load (see
+    load_mirrored_json). Only the files without copy are waited. A file
+    unreachable, unreadable or still not read when the timeout is reached
+    is returned as None.
+    """
+    if not filenames:
+        return []
+    if mirror_folder is None:
+        function = load_json
+    else:
+        function = partial(load_mirrored_json, mirror_folder=mirror_folder)
+    # the threads blocked on a slow file are not waited. They still update
+    # the mirror when they finish, for the next load.
+    pool = DaemonPool(function, filenames, threads)
+    deadline = time.time() + timeout
+    datas = []
+    for index, filename in enumerate(filenames):
+        data = None
+        if mirror_folder is not None:
+            mirror = get_mirror_filenames(filename, mirror_folder)[0]
+            data = load_mirror_json(mirror)
+        if data is None:
+            data = pool.result(index, max(deadline - time.time(), 0))
+        datas.append(data)
+    return datas
+
+
+class DaemonPool():
+    """
+    Call the function with each argument in a few daemon threads. Unlike
+    the concurrent.futures workers, the daemon threads are not joined when
+    the interpreter exits: a call blocked by an unreachable file server
+    never delays the application quit. A call raising an exception gives
+    None as result, the error is printed.
+    """
+    def __init__(self, function, arguments, threads):
+        self.function = function
+        self.results = [None] * len(arguments)
+        self.events = [threading.Event() for _ in arguments]
+        self._jobs = deque(enumerate(arguments))
+        for _ in range(min(threads, len(arguments))):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+
+    def result(self, index, timeout=None):
+        """ return the call result, None if it's not finished in time """
+        if not self.events[index].wait(timeout):
+            return None
+        return self.results[index]
+
+    def _work(self):
+        while True:
+            try:
+                index, argument = self._jobs.popleft()
+            except IndexError:
+                return
+            try:
+                self.results[index] = self.function(argument)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self.events[index].set()
+
+
+def get_mirror_filenames(filename, mirror_folder):
+    """ return the local copy and its metadata filenames """
+    path = os.path.abspath(filename).encode('utf-8')
+    basename = os.path.join(mirror_folder, hashlib.sha1(path).hexdigest())
+    return basename + '.json', basename + '.meta.json'
+
+
+def load_mirrored_json(filename, mirror_folder):
+    """
+    read a shared hotbox file from its local copy when the source file has
+    the same modification time and size than when it was copied. Else, the
+    source is read and the copy updated. If the source can't be read
+    (unreachable, permissions, partially synchronized file), the local
+    copy is returned, None if there's no copy.
+    """
+    mirror, meta = get_mirror_filenames(filename, mirror_folder)
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return load_mirror_json(mirror)
+    signature = {'mtime': stat.st_mtime, 'size': stat.st_size}
+    if load_mirror_json(meta) == signature:
+        data = load_mirror_json(mirror)
+        if data is not None:
+            return data
+    try:
+        data = load_json(filename)
+    except (OSError, ValueError):
+        return load_mirror_json(mirror)
+    if data is None:
+        return load_mirror_json(mirror)
+    try:
+        os.makedirs(mirror_folder, exist_ok=True)
+        # the copy is written before its metadata, a metadata matching the
+        # source always describe an up to date copy.
+        write_json_atomic(mirror, data)
+        write_json_atomic(meta, signature)
+    except OSError:
+        traceback.print_exc()
+    return data
+
+
+def load_mirror_json(filename):
+    # a damaged local copy is ignored, it's rewritten on the next refresh
+    try:
+        return load_json(filename)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_atomic(filename, data):
+    """
+    write the data in a temporary file renamed at the end. A reader never
+    find a partially written file.
+    """
+    write_text_atomic(filename, json.dumps(data))
+
+
+def write_text_atomic(filename, text):
+    folder = os.path.dirname(filename)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    temp = '{}.{}.{}.tmp'.format(
+        filename, os.getpid(), threading.current_thread().ident)
+    with open(temp, 'w') as f:
+        f.write(text)
+    os.replace(temp, filename)
 
 
 def copy_hotbox_data(data):
@@ -60,11 +308,66 @@ def copy_hotbox_data(data):
     return copied
 
 
+def encode_hotbox_data(data):
+    """
+    return the compact version of the hotbox data written on disk. Each
+    shape is stored as the name of the template it's closest to and the
+    options differing from that template:
+        {'template': 'text', 'options': {...}, 'missing': [...]}
+    'missing' lists the template options the shape doesn't have, it's
+    only present when there are.
+    """
+    return {
+        'version': DATA_VERSION,
+        'general': data['general'],
+        'shapes': [encode_shape_options(s) for s in data['shapes']]}
+
+
+def encode_shape_options(options):
+    candidates = []
+    for name, template in SHAPE_TEMPLATES[DATA_VERSION].items():
+        delta = {
+            key: value for key, value in options.items()
+            if key not in template or not is_same_value(template[key], value)}
+        missing = [key for key in template if key not in options]
+        candidates.append((len(delta) + len(missing), name, delta, missing))
+    _, name, delta, missing = min(candidates)
+    encoded = {'template': name, 'options': delta}
+    if missing:
+        encoded['missing'] = missing
+    return encoded
+
+
+def is_same_value(value1, value2):
+    # 2 == 2.0 and 0 == False, the type has to be kept through the encoding
+    return type(value1) is type(value2) and value1 == value2
+
+
+def decode_hotbox_data(data):
+    """ expand in place the compact hotbox data to the full options """
+    templates = SHAPE_TEMPLATES.get(data.get('version'))
+    if templates is None:
+        return data
+    del data['version']
+    data['shapes'] = [
+        decode_shape_options(s, templates) for s in data['shapes']]
+    return data
+
+
+def decode_shape_options(encoded, templates):
+    options = templates[encoded['template']].copy()
+    options.update(encoded['options'])
+    for key in encoded.get('missing', []):
+        del options[key]
+    return options
+
+
 def ensure_old_data_compatible(data):
     """
     Tests and update datas done with old version of the script
     This function contain all the data structure history to convertion
     """
+    data = decode_hotbox_data(data)
     try:
         del data['submenu']
     except:
@@ -77,6 +380,14 @@ def ensure_old_data_compatible(data):
         data['general']['leaveclose']
     except KeyError:
         data['general']['leaveclose'] = False
+    try:
+        data['general']['spritecache']
+    except KeyError:
+        data['general']['spritecache'] = False
+    try:
+        data['general']['execution']
+    except KeyError:
+        data['general']['execution'] = 'immediate'
 
     return data
 
@@ -88,7 +399,7 @@ def load_templates():
     for file_ in files:
         filepath = os.path.join(path, file_)
         with open(filepath, 'r') as f:
-            templates.append(json.load(f))
+            templates.append(ensure_old_data_compatible(json.load(f)))
     return templates
 
 
@@ -97,5 +408,7 @@ def hotbox_data_to_html(data):
         name=data['general']['name'],
         submenu=data['general']['submenu'],
         triggering=data['general']['triggering'],
+        execution=data['general']['execution'],
         aiming=data['general']['aiming'],
-        leaveclose=data['general']['leaveclose'])
+        leaveclose=data['general']['leaveclose'],
+        spritecache=data['general']['spritecache'])
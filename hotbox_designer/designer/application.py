@@ -6,7 +6,6 @@ from hotbox_designer.templates import SQUARE_BUTTON, TEXT, BACKGROUND
 from hotbox_designer.interactive import Shape
 from hotbox_designer.geometry import get_combined_rects
 from hotbox_designer.qtutils import set_shortcut
-from hotbox_designer.data import copy_hotbox_data
 from hotbox_designer.arrayutils import (
     move_elements_to_array_end, move_elements_to_array_begin,
     move_up_array_elements, move_down_array_elements)
@@ -14,10 +13,12 @@ from hotbox_designer.arrayutils import (
 from .editarea import ShapeEditArea
 from .menu import MenuWidget
 from .attributes import AttributeEditor
+from .undo import UndoManager
 
 
 class HotboxEditor(QtWidgets.QWidget):
     hotboxDataModified = QtCore.Signal(object)
+    closed = QtCore.Signal()
 
     def __init__(self, hotbox_data, application, parent=None):
         super(HotboxEditor, self).__init__(parent, QtCore.Qt.Window)
@@ -25,10 +26,10 @@ class HotboxEditor(QtWidgets.QWidget):
         self.options = hotbox_data['general']
         self.application = application
         self.clipboard = []
-        self.undo_manager = UndoManager(hotbox_data)
 
         self.shape_editor = ShapeEditArea(self.options)
         self.set_hotbox_data(hotbox_data)
+        self.undo_manager = UndoManager(self.hotbox_data(), self.shape_uids())
         self.shape_editor.selectedShapesChanged.connect(self.selection_changed)
         self.shape_editor.centerMoved.connect(self.move_center)
         method = self.set_data_modified
@@ -91,21 +92,21 @@ class HotboxEditor(QtWidgets.QWidget):
         self.vlayout.addWidget(self.menu)
         self.vlayout.addLayout(self.hlayout)
 
+    def closeEvent(self, event):
+        self.closed.emit()
+        return super(HotboxEditor, self).closeEvent(event)
+
     def copy(self):
         self.clipboard = [
             s.options.copy() for s in self.shape_editor.selection]
 
     def paste(self):
-        clipboad_copy = [s.copy() for s in self.clipboard]
-        shape_datas = self.hotbox_data()['shapes'][:] + clipboad_copy
-        hotbox_data = {
-            'general': self.options,
-            'shapes': shape_datas}
-        self.set_hotbox_data(hotbox_data)
-        self.undo_manager.set_data_modified(hotbox_data)
-        self.hotboxDataModified.emit(hotbox_data)
+        shapes = [Shape(options.copy()) for options in self.clipboard]
+        for shape in shapes:
+            self.shape_editor.shapes.append(shape)
+            self.shape_editor.index.insert(shape)
+        self.set_data_modified()
         # select new shapes
-        shapes = self.shape_editor.shapes [-len(self.clipboard):]
         self.shape_editor.selection.replace(shapes)
         self.shape_editor.update_selection()
         self.shape_editor.repaint()
@@ -114,14 +115,14 @@ class HotboxEditor(QtWidgets.QWidget):
         result = self.undo_manager.undo()
         if result is False:
             return
-        data = self.undo_manager.data
-        self.set_hotbox_data(data)
+        self.set_history_state()
         self.hotboxDataModified.emit(self.hotbox_data())
 
     def redo(self):
-        self.undo_manager.redo()
-        data = self.undo_manager.data
-        self.set_hotbox_data(data)
+        result = self.undo_manager.redo()
+        if result is False:
+            return
+        self.set_history_state()
         self.hotboxDataModified.emit(self.hotbox_data())
 
     def deselect_all(self):
@@ -140,8 +141,9 @@ class HotboxEditor(QtWidgets.QWidget):
         self.shape_editor.repaint()
 
     def set_data_modified(self):
-        self.undo_manager.set_data_modified(self.hotbox_data())
-        self.hotboxDataModified.emit(self.hotbox_data())
+        hotbox_data = self.hotbox_data()
+        self.undo_manager.set_data_modified(hotbox_data, self.shape_uids())
+        self.hotboxDataModified.emit(hotbox_data)
 
     def use_snap(self, state):
         snap = self.menu.snap_values() if state else None
@@ -160,6 +162,7 @@ class HotboxEditor(QtWidgets.QWidget):
     def option_set(self, option, value):
         for shape in self.shape_editor.selection:
             shape.options[option] = value
+            shape.invalidate()
         self.shape_editor.repaint()
         self.set_data_modified()
 
@@ -181,11 +184,14 @@ class HotboxEditor(QtWidgets.QWidget):
         shapes = self.shape_editor.selection
         for shape in shapes:
             shape.options[option] = value
+            shape.invalidate()
             if option == 'shape.height':
                 shape.rect.setHeight(value)
+                self.shape_editor.index.update(shape)
                 continue
             elif option == 'shape.width':
                 shape.rect.setWidth(value)
+                self.shape_editor.index.update(shape)
                 continue
 
             width = shape.rect.width()
@@ -196,6 +202,7 @@ class HotboxEditor(QtWidgets.QWidget):
                 shape.rect.setTop(value)
             shape.rect.setWidth(width)
             shape.rect.setHeight(height)
+            self.shape_editor.index.update(shape)
 
         rects = [shape.rect for shape in self.shape_editor.selection]
         rect = get_combined_rects(rects)
@@ -213,9 +220,11 @@ class HotboxEditor(QtWidgets.QWidget):
         shape.rect.moveCenter(self.shape_editor.rect().center())
         shape.synchronize_rect()
         if before is True:
-            self.shape_editor.shapes.insert(0, shape)
+            shapes = [shape] + self.shape_editor.shapes
+            self.shape_editor.set_shapes(shapes)
         else:
             self.shape_editor.shapes.append(shape)
+            self.shape_editor.index.insert(shape)
         self.shape_editor.repaint()
         self.set_data_modified()
 
@@ -228,6 +237,7 @@ class HotboxEditor(QtWidgets.QWidget):
         array = self.shape_editor.shapes
         elements = self.shape_editor.selection
         move_down_array_elements(array, elements)
+        self.shape_editor.set_shapes(array)
         self.shape_editor.repaint()
         self.set_data_modified()
 
@@ -235,13 +245,15 @@ class HotboxEditor(QtWidgets.QWidget):
         array = self.shape_editor.shapes
         elements = self.shape_editor.selection
         move_up_array_elements(array, elements)
+        self.shape_editor.set_shapes(array)
         self.shape_editor.repaint()
         self.set_data_modified()
 
     def set_selection_on_top(self):
         array = self.shape_editor.shapes
         elements = self.shape_editor.selection
-        self.shape_editor.shapes = move_elements_to_array_end(array, elements)
+        shapes = move_elements_to_array_end(array, elements)
+        self.shape_editor.set_shapes(shapes)
         self.shape_editor.repaint()
         self.set_data_modified()
 
@@ -249,13 +261,14 @@ class HotboxEditor(QtWidgets.QWidget):
         array = self.shape_editor.shapes
         elements = self.shape_editor.selection
         shapes = move_elements_to_array_begin(array, elements)
-        self.shape_editor.shapes = shapes
+        self.shape_editor.set_shapes(shapes)
         self.shape_editor.repaint()
         self.set_data_modified()
 
     def delete_selection(self):
         for shape in reversed(self.shape_editor.selection.shapes):
             self.shape_editor.shapes.remove(shape)
+            self.shape_editor.index.remove(shape)
             self.shape_editor.selection.remove(shape)
         rects = [shape.rect for shape in self.shape_editor.selection]
         rect = get_combined_rects(rects)
@@ -272,55 +285,34 @@ class HotboxEditor(QtWidgets.QWidget):
         self.options = hotbox_data['general']
         self.shape_editor.options = self.options
         shapes = [Shape(options) for options in hotbox_data['shapes']]
-        self.shape_editor.shapes = shapes
+        self.shape_editor.set_shapes(shapes)
         self.shape_editor.manipulator.rect = None
         self.shape_editor.repaint()
         if reset_stacks is True:
-            self.undo_manager.reset_stacks()
-
-
-class UndoManager():
-    def __init__(self, data):
-        self._current_state = data
-        self._modified = False
-        self._undo_stack = []
-        self._redo_stack = []
-
-    @property
-    def data(self):
-        return copy_hotbox_data(self._current_state)
-
-    def undo(self):
-        if not self._undo_stack:
-            print ('no undostack')
-            return False
-        self._redo_stack.append(copy_hotbox_data(self._current_state))
-        self._current_state = copy_hotbox_data(self._undo_stack[-1])
-        del self._undo_stack[-1]
-        return True
-
-    def redo(self):
-        if not self._redo_stack:
-            return False
-
-        self._undo_stack.append(copy_hotbox_data(self._current_state))
-        self._current_state = copy_hotbox_data(self._redo_stack[-1])
-        del self._redo_stack[-1]
-        return True
-
-    def set_data_modified(self, data):
-        self._redo_stack = []
-        self._undo_stack.append(copy_hotbox_data(self._current_state))
-        self._current_state = copy_hotbox_data(data)
-        self._modified = True
-
-    def set_data_saved(self):
-        self._modified = False
-
-    @property
-    def data_saved(self):
-        return not self._modified
-
-    def reset_stacks(self):
-        self._undo_stack = []
-        self._redo_stack = []
+            # the history restarts from the new data
+            self.undo_manager.reset_stacks(
+                self.hotbox_data(), self.shape_uids())
+
+    def shape_uids(self):
+        return [shape.uid for shape in self.shape_editor.shapes]
+
+    def set_history_state(self):
+        """
+        update the editor to the undo manager state. The shapes unchanged
+        are kept, only the modified ones are rebuilt.
+        """
+        self.options = self.undo_manager.general
+        self.shape_editor.options = self.options
+        existing_shapes = {s.uid: s for s in self.shape_editor.shapes}
+        shapes = []
+        for uid, options in self.undo_manager.shapes():
+            shape = existing_shapes.get(uid)
+            if shape is None or shape.options != options:
+                shape = Shape(options.copy())
+                shape.uid = uid
+            shapes.append(shape)
+        self.shape_editor.set_shapes(shapes)
+        selection = self.shape_editor.selection
+        selection.replace([s for s in selection if s in shapes])
+        self.shape_editor.update_selection()
+        self.shape_editor.repaint()
@@ -5,6 +5,7 @@ from hotbox_designer.interactive import Manipulator, SelectionSquare
 from hotbox_designer.geometry import Transform, snap, get_combined_rects
 from hotbox_designer.painting import draw_editor, draw_editor_center
 from hotbox_designer.qtutils import get_cursor
+from hotbox_designer.spatial import ShapeIndex
 
 
 class ShapeEditArea(QtWidgets.QWidget):
@@ -24,6 +25,9 @@ class ShapeEditArea(QtWidgets.QWidget):
         self.transform = Transform()
 
         self.shapes = []
+        # spatial index used for the hover and the picking
+        self.index = ShapeIndex()
+        self.hovered_shapes = []
         self.clicked_shape = None
         self.clicked = False
         self.handeling = False
@@ -48,8 +52,7 @@ class ShapeEditArea(QtWidgets.QWidget):
             self.repaint()
             return
 
-        for shape in self.shapes:
-            shape.set_hovered(cursor)
+        self.set_hovered_shapes(self.index.shapes_at(cursor))
 
         if self.selection_square.handeling:
             self.selection_square.handle(cursor)
@@ -59,15 +62,20 @@ class ShapeEditArea(QtWidgets.QWidget):
 
         self.manipulator_moved = True
         rect = self.manipulator.rect
+        # only the selected shapes are transformed and need to be updated
+        transformed_shapes = []
         if self.transform.direction:
             self.transform.resize([s.rect for s in self.selection], cursor)
             self.manipulator.update_geometries()
+            transformed_shapes = self.selection.shapes
         elif rect is not None and rect.contains(cursor):
             self.transform.move([s.rect for s in self.selection], cursor)
             self.manipulator.update_geometries()
-        for shape in self.shapes:
+            transformed_shapes = self.selection.shapes
+        for shape in transformed_shapes:
             shape.synchronize_rect()
-            shape.synchronize_image()
+            shape.synchronize_image_rect()
+            self.index.update(shape)
         self.increase_undo_on_release = True
         self.selectedShapesChanged.emit()
         self.repaint()
@@ -85,11 +93,7 @@ class ShapeEditArea(QtWidgets.QWidget):
             self.transform.set_rect(rect)
             self.transform.reference_rect = QtCore.QRectF(rect)
 
-        self.clicked_shape = None
-        for shape in reversed(self.shapes):
-            if shape.rect.contains(cursor):
-                self.clicked_shape = shape
-                break
+        self.clicked_shape = self.index.shape_at(cursor)
 
         if rect and rect.contains(cursor):
             self.transform.set_reference_point(cursor)
@@ -116,9 +120,7 @@ class ShapeEditArea(QtWidgets.QWidget):
             self.update_selection()
 
         if self.selection_square.handeling:
-            shapes = [
-                s for s in self.shapes
-                if s.rect.intersects(self.selection_square.rect)]
+            shapes = self.index.shapes_in(self.selection_square.rect)
             if shapes:
                 self.selection.set(shapes)
                 rects = [shape.rect for shape in self.selection]
@@ -162,6 +164,18 @@ class ShapeEditArea(QtWidgets.QWidget):
 
         self.repaint()
 
+    def set_shapes(self, shapes):
+        self.shapes = shapes
+        self.index.rebuild(shapes)
+        self.hovered_shapes = []
+
+    def set_hovered_shapes(self, shapes):
+        for shape in self.hovered_shapes:
+            shape.hovered = False
+        for shape in shapes:
+            shape.hovered = True
+        self.hovered_shapes = shapes
+
     def update_selection(self):
         rects = [shape.rect for shape in self.selection]
         self.manipulator.set_rect(get_combined_rects(rects))
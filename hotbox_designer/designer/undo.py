@@ -0,0 +1,256 @@
+import pickle
+import tempfile
+import zlib
+from hotbox_designer.data import copy_hotbox_data
+
+
+class Missing():
+    """
+    Marker of an option which doesn't exist on one side of a change. It
+    can't be confused with an option value and stays the same object once
+    the record is pickled.
+    """
+    def __repr__(self):
+        return 'MISSING'
+
+    def __reduce__(self):
+        return 'MISSING'
+
+
+MISSING = Missing()
+# count of change records kept in memory by each stack, the older ones are
+# spilled to a temporary file. None means no limit.
+UNDO_DEPTH = 50
+
+
+class UndoManager():
+    """
+    The manager keeps a copy of the current hotbox state and stores each
+    modification as a change record (see get_changes) instead of a full
+    copy of the hotbox. The shapes are identified by their uid, the editor
+    gives the uids with the data on each modification.
+    """
+    def __init__(self, data, uids, depth=UNDO_DEPTH):
+        self._set_state(data, uids)
+        self._modified = False
+        self._undo_stack = SpilledStack(depth)
+        self._redo_stack = SpilledStack(depth)
+
+    @property
+    def data(self):
+        return copy_hotbox_data({
+            'general': self._general,
+            'shapes': [self._shapes[uid] for uid in self._uids]})
+
+    @property
+    def general(self):
+        return self._general.copy()
+
+    def shapes(self):
+        """
+        return the current (uid, options) pairs. The options are the manager
+        internal ones, they have to be copied before being modified.
+        """
+        return [(uid, self._shapes[uid]) for uid in self._uids]
+
+    def undo(self):
+        if not self._undo_stack:
+            print ('no undostack')
+            return False
+        changes = self._undo_stack.pop()
+        self._apply(changes, revert=True)
+        self._redo_stack.append(changes)
+        return True
+
+    def redo(self):
+        if not self._redo_stack:
+            return False
+        changes = self._redo_stack.pop()
+        self._apply(changes)
+        self._undo_stack.append(changes)
+        return True
+
+    def set_data_modified(self, data, uids):
+        changes = get_changes(
+            self._general, self._uids, self._shapes,
+            data['general'], uids, data['shapes'])
+        if not changes:
+            return
+        self._redo_stack.clear()
+        self._apply(changes)
+        self._undo_stack.append(changes)
+        self._modified = True
+
+    def set_data_saved(self):
+        self._modified = False
+
+    @property
+    def data_saved(self):
+        return not self._modified
+
+    def reset_stacks(self, data=None, uids=None):
+        """
+        clear the history. If a data is given, the history restarts from
+        it. The saved state is kept.
+        """
+        self._undo_stack.clear()
+        self._redo_stack.clear()
+        if data is not None:
+            self._set_state(data, uids)
+
+    def _set_state(self, data, uids):
+        self._general = data['general'].copy()
+        self._uids = list(uids)
+        self._shapes = {
+            uid: options.copy() for uid, options in zip(uids, data['shapes'])}
+
+    def _apply(self, changes, revert=False):
+        # the records store (old value, new value) pairs
+        side = 0 if revert else 1
+        set_options(self._general, changes.get('general', {}), side)
+        for uid, options in changes.get('options', {}).items():
+            set_options(self._shapes[uid], options, side)
+        removed, added = ('inserted', 'deleted') if revert else (
+            'deleted', 'inserted')
+        removed_shapes = changes.get(removed, {})
+        uids = [uid for uid in self._uids if uid not in removed_shapes]
+        for uid in removed_shapes:
+            del self._shapes[uid]
+        if 'order' in changes:
+            uids = list(changes['order'][side])
+        # inserted by increasing index, each one at its final position
+        added_shapes = sorted(
+            changes.get(added, {}).items(), key=lambda item: item[1][0])
+        for uid, (index, options) in added_shapes:
+            uids.insert(index, uid)
+            self._shapes[uid] = options.copy()
+        self._uids = uids
+
+
+class SpilledStack():
+    """
+    Stack keeping its last records in memory. When the count of records
+    exceeds the depth, the oldest one is compressed and appended to a
+    temporary file (created on the first spill, deleted when closed). The
+    records are read back from the file when the memory part is emptied.
+    """
+    def __init__(self, depth=UNDO_DEPTH):
+        self.depth = depth
+        self._records = []
+        self._file = None
+        # offsets of the spilled records in the file, the last one is the
+        # most recent.
+        self._offsets = []
+
+    def __len__(self):
+        return len(self._records) + len(self._offsets)
+
+    def __bool__(self):
+        return bool(self._records or self._offsets)
+
+    def append(self, record):
+        self._records.append(record)
+        if self.depth is not None and len(self._records) > self.depth:
+            self._spill(self._records.pop(0))
+
+    def pop(self):
+        if not self._records and self._offsets:
+            self._records.append(self._unspill())
+        return self._records.pop()
+
+    def clear(self):
+        self._records = []
+        self._offsets = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def spilled_count(self):
+        return len(self._offsets)
+
+    def _spill(self, record):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix='hotbox_undo_')
+        self._file.seek(0, 2)
+        self._offsets.append(self._file.tell())
+        data = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+        self._file.write(zlib.compress(data))
+
+    def _unspill(self):
+        offset = self._offsets.pop()
+        self._file.seek(offset)
+        data = self._file.read()
+        # the file is used as a stack, the record read is the last one
+        self._file.seek(offset)
+        self._file.truncate()
+        return pickle.loads(zlib.decompress(data))
+
+
+def get_changes(
+        old_general, old_uids, old_shapes, new_general, new_uids, new_shapes):
+    """
+    return the record of the changes between two hotbox states. The old
+    shapes are given as a dict uid: options, the new ones as a list of
+    options in the order of the uids. That contains only the changed parts:
+        - 'general': {option: (old value, new value)}
+        - 'options': {shape uid: {option: (old value, new value)}}
+        - 'deleted': {shape uid: (old index, options)}
+        - 'inserted': {shape uid: (new index, options)}
+        - 'order': (old uids, new uids) of the shapes kept, only when they
+          are reordered.
+    The record only contain builtin types and MISSING, it can be pickled.
+    """
+    changes = {}
+    general = get_options_changes(old_general, new_general)
+    if general:
+        changes['general'] = general
+
+    options = {}
+    inserted = {}
+    for index, (uid, new_options) in enumerate(zip(new_uids, new_shapes)):
+        old_options = old_shapes.get(uid)
+        if old_options is None:
+            inserted[uid] = index, new_options.copy()
+            continue
+        shape_changes = get_options_changes(old_options, new_options)
+        if shape_changes:
+            options[uid] = shape_changes
+    if options:
+        changes['options'] = options
+    if inserted:
+        changes['inserted'] = inserted
+
+    uids = set(new_uids)
+    deleted = {
+        uid: (index, old_shapes[uid].copy())
+        for index, uid in enumerate(old_uids) if uid not in uids}
+    if deleted:
+        changes['deleted'] = deleted
+
+    old_kept = [uid for uid in old_uids if uid in uids]
+    new_kept = [uid for uid in new_uids if uid not in inserted]
+    if old_kept != new_kept:
+        changes['order'] = tuple(old_kept), tuple(new_kept)
+    return changes
+
+
+def get_options_changes(old_options, new_options):
+    if old_options == new_options:
+        return {}
+    keys = set(old_options) | set(new_options)
+    changes = {}
+    for key in keys:
+        old = old_options.get(key, MISSING)
+        new = new_options.get(key, MISSING)
+        if old != new:
+            changes[key] = old, new
+    return changes
+
+
+def set_options(options, changes, side):
+    for key, values in changes.items():
+        if values[side] is MISSING:
+            options.pop(key, None)
+        else:
+            options[key] = values[side]
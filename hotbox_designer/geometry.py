@@ -1,5 +1,8 @@
 import math
 from hotbox_designer.vendor.Qt import QtCore
+from hotbox_designer.batchgeometry import (
+    BATCH_THRESHOLD, get_rects_coords, set_rects_coords, remap_coords,
+    get_coords_bounds)
 
 POINT_RADIUS = 8
 POINT_OFFSET = 4
@@ -414,9 +417,14 @@ class Transform():
         self.apply_relative_transformation(rects)
 
     def apply_relative_transformation(self, rects):
-        for rect in rects:
-            resize_rect_with_reference(
-                rect, self.reference_rect, self.rect)
+        if len(rects) >= BATCH_THRESHOLD:
+            coords = remap_coords(
+                get_rects_coords(rects), self.reference_rect, self.rect)
+            set_rects_coords(rects, coords)
+        else:
+            for rect in rects:
+                resize_rect_with_reference(
+                    rect, self.reference_rect, self.rect)
 
         self.reference_rect = QtCore.QRectF(
             self.rect.topLeft(), self.rect.bottomRight())
@@ -453,6 +461,10 @@ def get_combined_rects(rects):
     """
     if not rects:
         return None
+    if len(rects) >= BATCH_THRESHOLD:
+        coords = get_rects_coords(rects)
+        left, top, right, bottom = get_coords_bounds(coords)
+        return QtCore.QRectF(left, top, right - left, bottom - top)
     left = min([rect.left() for rect in rects])
     right = max([rect.right() for rect in rects])
     top = min([rect.top() for rect in rects])
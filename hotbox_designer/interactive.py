@@ -1,12 +1,20 @@
-from hotbox_designer.vendor.Qt import QtCore, QtGui
+import itertools
+from hotbox_designer.vendor.Qt import QtCore
 
 from hotbox_designer.geometry import (
     DIRECTIONS, get_topleft_rect, get_bottomleft_rect, get_topright_rect,
     get_bottomright_rect, get_left_side_rect, get_right_side_rect,
     get_top_side_rect, get_bottom_side_rect, proportional_rect)
 from hotbox_designer.painting import (
-    draw_selection_square, draw_manipulator, get_hovered_path, draw_shape)
-from hotbox_designer.languages import execute_code
+    draw_selection_square, draw_manipulator, get_hovered_path, draw_shape,
+    get_shape_bounding_rect, get_shape_recipe)
+from hotbox_designer.languages import prepare_code, execute_prepared
+from hotbox_designer.cache import pixmap_cache
+from hotbox_designer.qtutils import get_device_pixel_ratio
+
+
+POSITION_OPTIONS = 'shape.left', 'shape.top'
+SHAPE_UIDS = itertools.count()
 
 
 class SelectionSquare():
@@ -99,13 +107,24 @@ def get_shape_rect_from_options(options):
 
 
 class Shape():
-    def __init__(self, options):
+    def __init__(self, options, asynchronous_image=False):
         self.hovered = False
         self.clicked = False
+        # unique identifier following the shape in the editor history
+        self.uid = next(SHAPE_UIDS)
         self.options = options
         self.rect = get_shape_rect_from_options(options)
         self.pixmap = None
         self.image_rect = None
+        # True while the image is decoded in background, the pixmap cache
+        # notifies its decoding with the image key.
+        self.image_pending = False
+        self.image_key = None
+        self.asynchronous_image = asynchronous_image
+        self._bounding_rect = None
+        self._signature = None
+        self._recipe = None
+        self._commands = {}
         self.synchronize_image()
 
     def set_hovered(self, cursor):
@@ -121,7 +140,41 @@ class Shape():
     def draw(self, painter):
         draw_shape(painter, self)
 
+    def bounding_rect(self):
+        """ return the widget area to update when the shape changed """
+        if self._bounding_rect is None:
+            self._bounding_rect = get_shape_bounding_rect(self)
+        return self._bounding_rect
+
+    def recipe(self):
+        """ return the painting resources built from the options """
+        if self._recipe is None:
+            self._recipe = get_shape_recipe(self)
+        return self._recipe
+
+    def signature(self):
+        """
+        return a hashable key describing the shape appearance. The integer
+        part of the position is excluded, so identical shapes placed at
+        different positions share the same signature.
+        """
+        if self._signature is None:
+            options = tuple(sorted(
+                (k, v) for k, v in self.options.items()
+                if k not in POSITION_OPTIONS))
+            self._signature = (
+                options, self.rect.left() % 1, self.rect.top() % 1,
+                self.image_pending)
+        return self._signature
+
+    def invalidate(self):
+        """ clear the data cached from the options """
+        self._bounding_rect = None
+        self._signature = None
+        self._recipe = None
+
     def synchronize_rect(self):
+        self.invalidate()
         self.options['shape.left'] = self.rect.left()
         self.options['shape.top'] = self.rect.top()
         self.options['shape.width'] = self.rect.width()
@@ -136,9 +189,28 @@ class Shape():
         side = 'left' if left else 'right' if right else None
         if not side or not self.options['action.' + side]:
             return
+        language, prepared = self.prepared_command(side)
+        execute_prepared(language, prepared)
+
+    def prepared_command(self, side):
+        """
+        return the language and the prepared code of the given side action.
+        The preparation is cached until the command or the language change.
+        """
         code = self.options['action.{}.command'.format(side)]
         language = self.options['action.{}.language'.format(side)]
-        execute_code(language, code)
+        key = language, code
+        command = self._commands.get(side)
+        if command is None or command[0] != key:
+            command = key, prepare_code(language, code)
+            self._commands[side] = command
+        return language, command[1]
+
+    def prepare_commands(self):
+        """ prepare the enabled actions, that raise on invalid code """
+        for side in ('left', 'right'):
+            if self.options['action.' + side]:
+                self.prepared_command(side)
 
     def is_interactive(self):
         return any([self.options['action.right'], self.options['action.left']])
@@ -154,8 +226,9 @@ class Shape():
             return  r_close or l_close
         return False
 
-    def synchronize_image(self):
-        self.pixmap = QtGui.QPixmap(self.options['image.path'])
+    def synchronize_image_rect(self):
+        """ update the image geometry without loading the image again """
+        self.invalidate()
         if self.options['image.fit'] is True:
             self.image_rect = None
             return
@@ -165,3 +238,17 @@ class Shape():
             self.options['image.width'],
             self.options['image.height'])
         self.image_rect.moveCenter(self.rect.center().toPoint())
+
+    def synchronize_image(self):
+        self.synchronize_image_rect()
+        path = self.options['image.path']
+        if not self.asynchronous_image or not path:
+            self.pixmap = pixmap_cache.get(path)
+            self.image_pending = False
+            return
+        # the image is decoded at its final drawing size, the shape is
+        # drawn without image until the pixmap is available.
+        rect = self.image_rect or self.content_rect()
+        size = rect.size() * get_device_pixel_ratio()
+        self.image_key, self.pixmap = pixmap_cache.request(path, size)
+        self.image_pending = self.pixmap is None
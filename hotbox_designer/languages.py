@@ -5,19 +5,46 @@ NUKE_TCL = 'nuke tcl'
 NUKE_EXPRESSION = 'nuke expression'
 HSCRIPT = 'houdini script'
 RUMBA_SCRIPT  = 'rumba script'
+PYTHON_FILENAME = '<hotbox command>'
+# namespace shared by all the hotbox commands executions. It's kept alive
+# between the clicks, a command can use names defined by a previous one.
+NAMESPACE = {'__name__': '__hotbox__'}
 
 
 def execute_code(language, code):
-    return EXECUTORS[language](code)
+    return execute_prepared(language, prepare_code(language, code))
+
+
+def prepare_code(language, code):
+    """
+    return the code ready to be executed by execute_prepared. The work which
+    doesn't depend of the execution (compilation, text normalization) is
+    done here, so the result can be kept and executed several times.
+    That raise a SyntaxError for an invalid python code.
+    """
+    preparer = PREPARERS.get(language)
+    return preparer(code) if preparer else code
+
+
+def execute_prepared(language, prepared):
+    return EXECUTORS[language](prepared)
+
+
+def prepare_python(code):
+    return compile(code, PYTHON_FILENAME, 'exec')
+
+
+def prepare_mel(code):
+    return code.replace(u'\u2029', '\n')
 
 
 def execute_python(code):
-    exec(code, globals())
+    exec(code, NAMESPACE)
 
 
 def execute_mel(code):
     from maya import mel
-    mel.eval(code.replace(u'\u2029', '\n'))
+    mel.eval(code)
 
 
 def execute_nuke_tcl(code):
@@ -36,7 +63,7 @@ def execute_hscript(code):
 
 def execute_rumba_script(code):
     import script
-    script.script_interpreter.exec_script(code, globals())
+    script.script_interpreter.exec_script(code, NAMESPACE)
 
 
 EXECUTORS = {
@@ -47,3 +74,9 @@ EXECUTORS = {
     HSCRIPT: execute_hscript,
     RUMBA_SCRIPT: execute_rumba_script
 }
+
+
+PREPARERS = {
+    PYTHON: prepare_python,
+    MEL: prepare_mel
+}
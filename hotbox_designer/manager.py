@@ -6,20 +6,22 @@ from hotbox_designer.vendor.Qt import QtWidgets, QtCore
 
 import hotbox_designer
 from hotbox_designer.commands import OPEN_COMMAND, CLOSE_COMMAND, SWITCH_COMMAND
-from hotbox_designer.reader import HotboxReader
+from hotbox_designer.runtime import update_hotbox, remove_hotbox, rename_hotbox
 from hotbox_designer.designer.application import HotboxEditor
 from hotbox_designer.applications import Nuke, Maya, Houdini, Rumba
+from hotbox_designer.autosave import SaveScheduler
 from hotbox_designer.widgets import BoolCombo, Title, CommandButton
 from hotbox_designer.qtutils import icon
 from hotbox_designer.dialog import (
     import_hotbox, export_hotbox, import_hotbox_link, CreateHotboxDialog,
     CommandDisplayDialog, HotkeySetter, warning)
 from hotbox_designer.data import (
-    get_valid_name, TRIGGERING_TYPES, save_datas, load_hotboxes_datas,
-    hotbox_data_to_html, load_json, ensure_old_data_compatible)
+    get_valid_name, TRIGGERING_TYPES, EXECUTION_TYPES, copy_hotbox_data,
+    load_hotboxes_datas, hotbox_data_to_html, load_json,
+    load_shared_hotboxes_datas, get_hotboxes_files,
+    ensure_old_data_compatible)
 
 
-hotboxes = {}
 hotbox_manager = None
 APPLICATIONS = {'maya': Maya, 'nuke': Nuke, 'houdini': Houdini, 'rumba': Rumba}
 
@@ -31,50 +33,6 @@ def launch_manager(application):
     hotbox_manager.show()
 
 
-def initialize(application):
-    if hotboxes:
-        return
-    load_hotboxes(application)
-
-
-def load_hotboxes(application):
-    hotboxes_datas = load_hotboxes_datas(application.local_file)
-    file_ = application.shared_file
-    hotboxes_datas += [
-        ensure_old_data_compatible(load_json(f)) for f in load_json(file_)]
-
-    for hotboxes_data in hotboxes_datas:
-        name = hotboxes_data['general']['name']
-        reader = HotboxReader(hotboxes_data, parent=None)
-        reader.hideSubmenusRequested.connect(hide_submenus)
-        hotboxes[name] = reader
-
-
-def clear_loaded_hotboxes():
-    global hotboxes
-    hotboxes = {}
-
-
-def show(name):
-    hotboxes[name].show()
-
-
-def hide(name):
-    hotboxes[name].hide()
-
-
-def switch(name):
-    if hotboxes[name].isVisible():
-        return hide(name)
-    return show(name)
-
-
-def hide_submenus():
-    for name in hotboxes:
-        if hotboxes[name].is_submenu:
-            hide(name)
-
-
 class HotboxManager(QtWidgets.QWidget):
     def __init__(self, application):
         parent = application.main_window
@@ -82,8 +40,11 @@ class HotboxManager(QtWidgets.QWidget):
         self.setWindowTitle('Hotbox Designer')
         self.application = application
         self.hotbox_designer = None
+        self.save_scheduler = SaveScheduler(self.get_save_snapshot, parent=self)
+        self.save_scheduler.saved.connect(self.application.update_hotkeys)
 
-        hotboxes_data = load_hotboxes_datas(self.application.local_file)
+        hotboxes_data = load_hotboxes_datas(
+            self.application.local_file, self.application.local_storage)
         self.personnal_model = HotboxPersonalTableModel(hotboxes_data)
         self.personnal_view = HotboxTableView()
         self.personnal_view.set_model(self.personnal_model)
@@ -125,7 +86,8 @@ class HotboxManager(QtWidgets.QWidget):
         self.hlayout.addWidget(self.edit)
 
         links = load_json(application.shared_file, default=[])
-        self.shared_model = HotboxSharedTableModel(links)
+        self.shared_model = HotboxSharedTableModel(
+            links, mirror_folder=application.shared_mirror_folder)
         self.shared_view = HotboxTableView()
         self.shared_view.set_model(self.shared_model)
         method = self._shared_selected_row_changed
@@ -171,13 +133,21 @@ class HotboxManager(QtWidgets.QWidget):
         return model.hotboxes[row]
 
     def save_hotboxes(self, *_):
-        save_datas(self.application.local_file, self.personnal_model.hotboxes)
-        datas = self.shared_model.hotboxes_links
-        save_datas(self.application.shared_file, datas)
-        try:
-            self.application.update_hotkeys()
-        except Exception as e:
-            raise e
+        # the manager actions are saved right away, the files are on disk
+        # when the action returns.
+        self.save_scheduler.flush(wait=True)
+
+    def get_save_snapshot(self):
+        hotboxes = [copy_hotbox_data(h) for h in self.personnal_model.hotboxes]
+        links = list(self.shared_model.hotboxes_links)
+        files = get_hotboxes_files(
+            self.application.local_file, hotboxes,
+            self.application.local_storage)
+        return files + [(self.application.shared_file, links)]
+
+    def editor_closed(self):
+        if self.save_scheduler.pending:
+            self.save_scheduler.flush(wait=True)
 
     def _personnal_selected_row_changed(self):
         hotbox = self.get_selected_hotbox()
@@ -196,9 +166,12 @@ class HotboxManager(QtWidgets.QWidget):
 
     def hotbox_data_modified(self, hotbox_data):
         row = self.personnal_view.get_selected_row()
+        old_name = self.personnal_model.hotboxes[row]['general']['name']
         self.personnal_model.set_hotbox(row, hotbox_data)
-        clear_loaded_hotboxes()
-        self.save_hotboxes()
+        update_hotbox(hotbox_data, old_name)
+        # the editor emits a modification for each interaction, they are
+        # saved together once the edition pauses.
+        self.save_scheduler.schedule()
 
     def _shared_selected_row_changed(self):
         index = self.shared_view.get_selected_row()
@@ -266,6 +239,7 @@ class HotboxManager(QtWidgets.QWidget):
             parent=self.application.main_window)
         method = self.hotbox_data_modified
         self.hotbox_designer.hotboxDataModified.connect(method)
+        self.hotbox_designer.closed.connect(self.editor_closed)
         self.hotbox_designer.show()
 
     def _call_create(self):
@@ -284,7 +258,7 @@ class HotboxManager(QtWidgets.QWidget):
             self.personnal_view.selectRow(hotbox_count)
 
         self.save_hotboxes()
-        clear_loaded_hotboxes()
+        update_hotbox(self.personnal_model.hotboxes[-1])
 
     def _call_add_link(self):
         filename = import_hotbox_link()
@@ -297,15 +271,19 @@ class HotboxManager(QtWidgets.QWidget):
             self.shared_view.selectRow(hotbox_count)
 
         self.save_hotboxes()
-        clear_loaded_hotboxes()
+        hotbox = self.shared_model.hotboxes[-1]
+        if hotbox is not None:
+            update_hotbox(hotbox)
 
     def _call_unlink(self):
         index = self.shared_view.get_selected_row()
         if index is None:
             return warning('Hotbox designer', 'No hotbox selected')
+        hotbox = self.shared_model.hotboxes[index]
         self.shared_model.remove_link(index)
         self.save_hotboxes()
-        clear_loaded_hotboxes()
+        if hotbox is not None:
+            remove_hotbox(hotbox['general']['name'])
 
     def _call_remove(self):
         hotbox = self.get_selected_hotbox()
@@ -326,7 +304,7 @@ class HotboxManager(QtWidgets.QWidget):
         self.personnal_model.hotboxes.remove(hotbox)
         self.personnal_model.layoutChanged.emit()
         self.save_hotboxes()
-        clear_loaded_hotboxes()
+        remove_hotbox(hotbox['general']['name'])
 
     def _call_option_set(self, option, value):
         self.personnal_model.layoutAboutToBeChanged.emit()
@@ -334,11 +312,18 @@ class HotboxManager(QtWidgets.QWidget):
         if option == 'name':
             value = get_valid_name(self.personnal_model.hotboxes, value)
 
-        if hotbox is not None:
-            hotbox['general'][option] = value
+        if hotbox is None:
+            self.personnal_model.layoutChanged.emit()
+            return
+
+        old_name = hotbox['general']['name']
+        hotbox['general'][option] = value
         self.personnal_model.layoutChanged.emit()
         self.save_hotboxes()
-        clear_loaded_hotboxes()
+        if option == 'name':
+            rename_hotbox(old_name, value)
+        else:
+            update_hotbox(hotbox)
 
     def _call_set_hotkey(self):
         hotbox = self.get_selected_hotbox()
@@ -382,7 +367,7 @@ class HotboxManager(QtWidgets.QWidget):
         self.personnal_model.hotboxes.append(hotbox)
         self.personnal_model.layoutChanged.emit()
         self.save_hotboxes()
-        clear_loaded_hotboxes()
+        update_hotbox(hotbox)
 
 
 class HotboxManagerToolbar(QtWidgets.QToolBar):
@@ -497,10 +482,15 @@ class HotboxPersonalTableModel(QtCore.QAbstractTableModel):
 
 class HotboxSharedTableModel(QtCore.QAbstractTableModel):
 
-    def __init__(self, hotboxes_links, parent=None):
+    def __init__(self, hotboxes_links, mirror_folder=None, parent=None):
         super(HotboxSharedTableModel, self).__init__(parent=parent)
         self.hotboxes_links = hotboxes_links
-        self.hotboxes = [load_json(l) for l in hotboxes_links]
+        datas = load_shared_hotboxes_datas(
+            hotboxes_links, mirror_folder=mirror_folder)
+        # an unreachable hotbox stays None to keep the links order
+        self.hotboxes = [
+            ensure_old_data_compatible(data) if data is not None else None
+            for data in datas]
 
     def columnCount(self, _):
         return 1
@@ -511,7 +501,10 @@ class HotboxSharedTableModel(QtCore.QAbstractTableModel):
     def add_link(self, hotbox_link):
         self.layoutAboutToBeChanged.emit()
         self.hotboxes_links.append(hotbox_link)
-        self.hotboxes.append(load_json(hotbox_link))
+        hotbox = load_json(hotbox_link)
+        if hotbox is not None:
+            hotbox = ensure_old_data_compatible(hotbox)
+        self.hotboxes.append(hotbox)
         self.layoutChanged.emit()
 
     def remove_link(self, index):
@@ -569,11 +562,17 @@ class HotboxGeneralSettingWidget(QtWidgets.QWidget):
         self.triggering = QtWidgets.QComboBox()
         self.triggering.addItems(TRIGGERING_TYPES)
         self.triggering.currentIndexChanged.connect(self._triggering_changed)
+        self.execution = QtWidgets.QComboBox()
+        self.execution.addItems(EXECUTION_TYPES)
+        self.execution.currentIndexChanged.connect(self._execution_changed)
         self.aiming = BoolCombo(False)
         self.aiming.valueSet.connect(partial(self.optionSet.emit, 'aiming'))
         self.leaveclose = BoolCombo(False)
         method = partial(self.optionSet.emit, 'leaveclose')
         self.leaveclose.valueSet.connect(method)
+        self.spritecache = BoolCombo(False)
+        method = partial(self.optionSet.emit, 'spritecache')
+        self.spritecache.valueSet.connect(method)
 
         self.open_command = CommandButton('show')
         self.close_command = CommandButton('hide')
@@ -589,8 +588,10 @@ class HotboxGeneralSettingWidget(QtWidgets.QWidget):
         self.layout.addItem(QtWidgets.QSpacerItem(0, 8))
         self.layout.addRow('is submenu', self.submenu)
         self.layout.addRow('triggering', self.triggering)
+        self.layout.addRow('execution', self.execution)
         self.layout.addRow('aiming', self.aiming)
         self.layout.addRow('close on leave', self.leaveclose)
+        self.layout.addRow('sprite cache', self.spritecache)
         self.layout.addItem(QtWidgets.QSpacerItem(0, 8))
         self.layout.addRow(Title('Commands'))
         self.layout.addItem(QtWidgets.QSpacerItem(0, 8))
@@ -601,6 +602,9 @@ class HotboxGeneralSettingWidget(QtWidgets.QWidget):
     def _triggering_changed(self, _):
         self.optionSet.emit('triggering', self.triggering.currentText())
 
+    def _execution_changed(self, _):
+        self.optionSet.emit('execution', self.execution.currentText())
+
     def _touch_changed(self, _):
         self.optionSet.emit('touch', self.touch.text())
 
@@ -609,6 +613,8 @@ class HotboxGeneralSettingWidget(QtWidgets.QWidget):
         self.submenu.setCurrentText(str(hotbox_settings['submenu']))
         self.name.setText(hotbox_settings['name'])
         self.triggering.setCurrentText(hotbox_settings['triggering'])
+        self.execution.setCurrentText(hotbox_settings['execution'])
         self.aiming.setCurrentText(str(hotbox_settings['aiming']))
         self.leaveclose.setCurrentText(str(hotbox_settings['leaveclose']))
+        self.spritecache.setCurrentText(str(hotbox_settings['spritecache']))
         self.blockSignals(False)
@@ -1,3 +1,4 @@
+from collections import namedtuple
 from hotbox_designer.vendor.Qt import QtCore, QtGui
 from hotbox_designer.qtutils import VALIGNS, HALIGNS
 from hotbox_designer.geometry import grow_rect
@@ -5,6 +6,12 @@ from hotbox_designer.geometry import grow_rect
 
 MANIPULATOR_BORDER = 5
 SELECTION_COLOR = '#3388FF'
+AIMING_LINE_WIDTH = 3
+SHAPE_STATES = 'normal', 'hovered', 'clicked'
+SNAP_GRID_BRUSHES = {}
+ShapeRecipe = namedtuple('ShapeRecipe', [
+    'states', 'ellipse', 'image_rect', 'text', 'text_rect', 'text_pen',
+    'text_brush', 'font', 'flags'])
 
 
 def draw_editor(painter, rect, snap=None):
@@ -17,19 +24,28 @@ def draw_editor(painter, rect, snap=None):
     painter.setBrush(brush)
     painter.drawRect(rect)
 
-    if snap is None:
+    if snap is None or snap[0] <= 0 or snap[1] <= 0:
         return
-    # draw snap grid
-    pen = QtGui.QPen(QtGui.QColor('red'))
-    painter.setPen(pen)
-    x = 0
-    y = 0
-    while y < rect.bottom():
-        painter.drawPoint(x, y)
-        x += snap[0]
-        if x > rect.right():
-            x = 0
-            y += snap[1]
+    # draw snap grid, the brush texture is aligned on the painter origin
+    painter.fillRect(rect, get_snap_grid_brush(snap))
+
+
+def get_snap_grid_brush(snap):
+    """
+    return a brush tiling a snap grid point. That's rendered once per snap
+    values and is much faster than drawing every point at each paint.
+    """
+    snap = tuple(snap)
+    if snap not in SNAP_GRID_BRUSHES:
+        tile = QtGui.QPixmap(*snap)
+        tile.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter()
+        painter.begin(tile)
+        painter.setPen(QtGui.QPen(QtGui.QColor('red')))
+        painter.drawPoint(0, 0)
+        painter.end()
+        SNAP_GRID_BRUSHES[snap] = QtGui.QBrush(tile)
+    return SNAP_GRID_BRUSHES[snap]
 
 
 def draw_editor_center(painter, rect, point):
@@ -61,52 +77,97 @@ def get_center_path(point):
     return path
 
 
-def draw_shape(painter, shape):
-    options = shape.options
-    content_rect = shape.content_rect()
+def get_shape_state(shape):
     if shape.clicked:
-        bordercolor = QtGui.QColor(options['bordercolor.clicked'])
-        backgroundcolor = QtGui.QColor(options['bgcolor.clicked'])
-        bordersize = options['borderwidth.clicked']
+        return 'clicked'
     elif shape.hovered:
-        bordercolor = QtGui.QColor(options['bordercolor.hovered'])
-        backgroundcolor = QtGui.QColor(options['bgcolor.hovered'])
-        bordersize = options['borderwidth.hovered']
-    else:
-        bordercolor = QtGui.QColor(options['bordercolor.normal'])
-        backgroundcolor = QtGui.QColor(options['bgcolor.normal'])
-        bordersize = options['borderwidth.normal']
-    textcolor = QtGui.QColor(options['text.color'])
-    alpha = options['bordercolor.transparency'] if options['border'] else 255
-    bordercolor.setAlpha(255 - alpha)
-    backgroundcolor.setAlpha(255 - options['bgcolor.transparency'])
+        return 'hovered'
+    return 'normal'
+
 
-    pen = QtGui.QPen(bordercolor)
-    pen.setStyle(QtCore.Qt.SolidLine)
-    pen.setWidthF(bordersize)
+def draw_shape(painter, shape, state=None):
+    recipe = shape.recipe()
+    state = state or get_shape_state(shape)
+    pen, brush = recipe.states[state]
     painter.setPen(pen)
-    painter.setBrush(QtGui.QBrush(backgroundcolor))
-    if options['shape'] == 'square':
-        painter.drawRect(shape.rect)
-    else:
+    painter.setBrush(brush)
+    if recipe.ellipse:
         painter.drawEllipse(shape.rect)
+    else:
+        painter.drawRect(shape.rect)
 
     if shape.pixmap is not None:
-        rect = shape.image_rect or content_rect
-        painter.drawPixmap(rect, shape.pixmap)
+        painter.drawPixmap(recipe.image_rect, shape.pixmap)
+
+    if not recipe.text:
+        return
+    painter.setPen(recipe.text_pen)
+    painter.setBrush(recipe.text_brush)
+    painter.setFont(recipe.font)
+    painter.drawText(recipe.text_rect, recipe.flags, recipe.text)
+
 
-    painter.setPen(QtGui.QPen(textcolor))
-    painter.setBrush(QtGui.QBrush(textcolor))
-    option = QtGui.QTextOption()
+def get_shape_recipe(shape):
+    """
+    build all the painting resources needed by draw_shape from the shape
+    options. That's done once per option change instead of each paint.
+    """
+    options = shape.options
+    states = {}
+    alpha = options['bordercolor.transparency'] if options['border'] else 255
+    for state in SHAPE_STATES:
+        bordercolor = QtGui.QColor(options['bordercolor.' + state])
+        backgroundcolor = QtGui.QColor(options['bgcolor.' + state])
+        bordercolor.setAlpha(255 - alpha)
+        backgroundcolor.setAlpha(255 - options['bgcolor.transparency'])
+        pen = QtGui.QPen(bordercolor)
+        pen.setStyle(QtCore.Qt.SolidLine)
+        pen.setWidthF(options['borderwidth.' + state])
+        states[state] = pen, QtGui.QBrush(backgroundcolor)
+
+    textcolor = QtGui.QColor(options['text.color'])
+    content_rect = shape.content_rect()
     flags = VALIGNS[options['text.valign']] | HALIGNS[options['text.halign']]
-    option.setAlignment(flags)
+    return ShapeRecipe(
+        states=states,
+        ellipse=options['shape'] != 'square',
+        image_rect=shape.image_rect or content_rect,
+        text=options['text.content'],
+        text_rect=QtCore.QRectF(content_rect),
+        text_pen=QtGui.QPen(textcolor),
+        text_brush=QtGui.QBrush(textcolor),
+        font=get_shape_font(options),
+        flags=flags)
+
+
+def get_shape_font(options):
     font = QtGui.QFont()
     font.setBold(options['text.bold'])
     font.setItalic(options['text.italic'])
     font.setPixelSize(options['text.size'])
-    painter.setFont(font)
-    text = options['text.content']
-    painter.drawText(QtCore.QRectF(content_rect), flags, text)
+    return font
+
+
+def get_shape_bounding_rect(shape):
+    """
+    return the integer rect covering everything draw_shape can paint for the
+    given shape: the border, the image and the text overflowing the shape.
+    """
+    options = shape.options
+    borderwidth = max(options['borderwidth.' + s] for s in SHAPE_STATES)
+    # one pixel more for the antialiasing
+    rect = grow_rect(shape.rect, (borderwidth / 2.0) + 1)
+    if shape.image_rect is not None:
+        rect = rect.united(QtCore.QRectF(shape.image_rect))
+    if options['text.content']:
+        flags = (
+            VALIGNS[options['text.valign']] |
+            HALIGNS[options['text.halign']])
+        metrics = QtGui.QFontMetrics(get_shape_font(options))
+        text_rect = metrics.boundingRect(
+            shape.content_rect(), flags, options['text.content'])
+        rect = rect.united(QtCore.QRectF(text_rect))
+    return rect.toAlignedRect()
 
 
 def draw_selection_square(painter, rect):
@@ -144,6 +205,43 @@ def draw_manipulator(painter, manipulator, cursor):
     painter.drawRect(manipulator.rect)
 
 
+def render_shape_sprite(shape, state, ratio=1.0):
+    """
+    render the shape in the given state in a transparent pixmap covering
+    the shape bounding rect.
+    """
+    rect = shape.bounding_rect()
+    pixmap = QtGui.QPixmap(rect.size() * ratio)
+    pixmap.setDevicePixelRatio(ratio)
+    pixmap.fill(QtCore.Qt.transparent)
+    painter = QtGui.QPainter()
+    painter.begin(pixmap)
+    painter.setRenderHint(QtGui.QPainter.Antialiasing)
+    painter.translate(-rect.left(), -rect.top())
+    draw_shape(painter, shape, state)
+    painter.end()
+    return pixmap
+
+
+def render_shapes_layer(shapes, size, ratio=1.0, background=False):
+    """
+    render the given shapes once in a transparent pixmap which can be blit
+    at each paint instead of drawing the shapes again.
+    """
+    pixmap = QtGui.QPixmap(size * ratio)
+    pixmap.setDevicePixelRatio(ratio)
+    pixmap.fill(QtCore.Qt.transparent)
+    painter = QtGui.QPainter()
+    painter.begin(pixmap)
+    painter.setRenderHint(QtGui.QPainter.Antialiasing)
+    if background is True:
+        draw_aiming_background(painter, QtCore.QRect(QtCore.QPoint(), size))
+    for shape in shapes:
+        shape.draw(painter)
+    painter.end()
+    return pixmap
+
+
 def draw_aiming_background(painter, rect):
     pen = QtGui.QPen(QtGui.QColor(0, 0, 0, 0))
     brush = QtGui.QBrush(QtGui.QColor(0, 0, 0, 1))
@@ -154,12 +252,18 @@ def draw_aiming_background(painter, rect):
 
 def draw_aiming(painter, center, target):
     pen = QtGui.QPen(QtGui.QColor(35, 35, 35))
-    pen.setWidth(3)
+    pen.setWidth(AIMING_LINE_WIDTH)
     painter.setPen(pen)
     painter.setBrush(QtGui.QColor(0, 0, 0, 0))
     painter.drawLine(center, target)
 
 
+def get_aiming_rect(center, target):
+    """ return the integer rect covering the aiming line painting """
+    rect = QtCore.QRectF(QtCore.QPointF(center), QtCore.QPointF(target))
+    return grow_rect(rect.normalized(), AIMING_LINE_WIDTH).toAlignedRect()
+
+
 def get_hovered_path(rect):
     path = QtGui.QPainterPath()
     path.addRect(rect)
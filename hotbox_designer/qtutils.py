@@ -17,6 +17,11 @@ def icon(filename):
     return QtGui.QIcon(os.path.join(ICONDIR, 'resources', 'icons', filename))
 
 
+def get_device_pixel_ratio():
+    application = QtWidgets.QApplication.instance()
+    return application.devicePixelRatio() if application else 1.0
+
+
 def get_cursor(widget):
     return widget.mapFromGlobal(QtGui.QCursor.pos())
 
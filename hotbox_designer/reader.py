@@ -1,28 +1,92 @@
+import traceback
+from collections import deque
 from hotbox_designer.vendor.Qt import QtWidgets, QtCore, QtGui
 from hotbox_designer.interactive import Shape
 from hotbox_designer.qtutils import get_cursor
-from hotbox_designer.painting import draw_aiming, draw_aiming_background
-from hotbox_designer.geometry import distance, segment_cross_rect
+from hotbox_designer.painting import (
+    draw_aiming, get_aiming_rect, render_shapes_layer)
+from hotbox_designer.geometry import distance
+from hotbox_designer.spatial import ShapeIndex, SectorTable
+from hotbox_designer.cache import SpriteCache, pixmap_cache
+
+
+class ActionQueue():
+    """
+    Queue of shape actions executed by the event loop. The reader in
+    deferred mode hide and repaint itself before the action is called, so a
+    slow command doesn't freeze the hotbox on screen. The actions are
+    executed in click order and an exception raised by one of them is
+    reported without cancelling the next ones.
+    """
+    def __init__(self):
+        self.actions = deque()
+
+    def append(self, shape, left=False, right=False):
+        self.actions.append((shape, left, right))
+        if len(self.actions) == 1:
+            QtCore.QTimer.singleShot(0, self.execute)
+
+    def execute(self):
+        while self.actions:
+            shape, left, right = self.actions[0]
+            try:
+                shape.execute(left=left, right=right)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self.actions.popleft()
+
+
+action_queue = ActionQueue()
 
 
 class HotboxWidget(QtWidgets.QWidget):
+    hoveredShapeChanged = QtCore.Signal(object, object)
+
     def __init__(self, *args, **kwargs):
         super(HotboxWidget, self).__init__(*args, **kwargs)
         self.setMouseTracking(True)
         self.shapes = []
         self.interactive_shapes = []
+        self.static_shapes = []
+        self.dynamic_shapes = []
+        self.static_layer = None
+        self.sprite_cache = None
+        self.index = ShapeIndex()
+        self.hovered_shape = None
+        # shapes waiting for their image by image key
+        self.pending_images = {}
         self.left_clicked = False
         self.right_clicked = False
+        pixmap_cache.pixmapLoaded.connect(self.image_loaded)
 
     def set_hotbox_data(self, hotbox_data):
-        self.shapes = [Shape(shape) for shape in hotbox_data['shapes']]
+        self.shapes = [
+            Shape(shape, asynchronous_image=True)
+            for shape in hotbox_data['shapes']]
         self.interactive_shapes = [
             s for s in self.shapes if s.is_interactive()]
+        prepare_commands(self.interactive_shapes)
+        self.static_shapes, self.dynamic_shapes = split_static_shapes(
+            self.shapes)
+        self.static_layer = None
+        use_sprite_cache = hotbox_data['general'].get('spritecache', False)
+        self.set_sprite_cache_enabled(use_sprite_cache)
+        self.index = ShapeIndex(self.interactive_shapes)
+        self.hovered_shape = None
+        self.pending_images = get_pending_images(self.shapes)
         self.repaint()
 
     def clear(self):
         self.shapes = []
         self.interactive_shapes = []
+        self.static_shapes = []
+        self.dynamic_shapes = []
+        self.static_layer = None
+        self.sprite_cache = None
+        self.index = ShapeIndex()
+        self.hovered_shape = None
+        self.pending_images = {}
         self.repaint()
 
     @property
@@ -30,53 +94,79 @@ class HotboxWidget(QtWidgets.QWidget):
         return self.right_clicked or self.left_clicked
 
     def mouseMoveEvent(self, _):
-        shapes = self.interactive_shapes
-        set_shapes_hovered(shapes, get_cursor(self), self.clicked)
-        self.repaint()
+        self.set_hovered_shape(self.index.shape_at(get_cursor(self)))
 
     def leaveEvent(self, _):
-        shapes = self.interactive_shapes
-        set_shapes_hovered(shapes, get_cursor(self), self.clicked)
-        self.repaint()
+        self.set_hovered_shape(self.index.shape_at(get_cursor(self)))
 
     def mousePressEvent(self, event):
         if event.button() == QtCore.Qt.RightButton:
             self.right_clicked = True
         elif event.button() == QtCore.Qt.LeftButton:
             self.left_clicked = True
-        for shape in self.shapes:
-            if shape.is_interactive():
-                if shape.hovered and self.clicked:
-                    shape.clicked = True
-                else:
-                    shape.clicked = False
-        self.repaint()
+        self.update_hovered_shape_clicked()
 
     def mouseReleaseEvent(self, event):
-        execute_hovered_shape(
-            self.shapes, self.left_clicked, self.right_clicked)
+        execute_shape(
+            self.hovered_shape, self.left_clicked, self.right_clicked)
 
         if event.button() == QtCore.Qt.RightButton:
             self.right_clicked = False
         elif event.button() == QtCore.Qt.LeftButton:
             self.left_clicked = False
 
-        for shape in self.shapes:
-            if shape.is_interactive():
-                shape.clicked = bool(shape.hovered and self.clicked)
-        self.repaint()
+        self.update_hovered_shape_clicked()
+
+    def set_hovered_shape(self, shape):
+        old_shape = self.hovered_shape
+        if shape is old_shape:
+            return
+        self.hovered_shape = shape
+        set_hover_transition(old_shape, shape, self.clicked)
+        self.update_shapes([s for s in (old_shape, shape) if s is not None])
+        self.hoveredShapeChanged.emit(old_shape, shape)
+
+    def update_hovered_shape_clicked(self):
+        shape = self.hovered_shape
+        if shape is None or shape.clicked == self.clicked:
+            return
+        shape.clicked = self.clicked
+        self.update_shapes([shape])
 
-    def paintEvent(self, _):
+    def update_shapes(self, shapes):
+        for shape in shapes:
+            self.update(shape.bounding_rect())
+
+    def get_static_layer(self):
+        ratio = self.devicePixelRatioF()
+        if not is_layer_valid(self.static_layer, self.size(), ratio):
+            self.static_layer = render_shapes_layer(
+                self.static_shapes, self.size(), ratio)
+        return self.static_layer
+
+    def paintEvent(self, event):
         painter = QtGui.QPainter()
         painter.begin(self)
         painter.setRenderHint(QtGui.QPainter.Antialiasing)
-        for shape in self.shapes:
-            shape.draw(painter)
+        painter.drawPixmap(0, 0, self.get_static_layer())
+        draw_shapes(
+            painter, self.dynamic_shapes, event.rect(), self.sprite_cache)
         painter.end()
 
+    def set_sprite_cache_enabled(self, state, max_bytes=None):
+        self.sprite_cache = SpriteCache(max_bytes) if state else None
+        self.update()
+
+    def image_loaded(self, key):
+        if not load_pending_images(self.pending_images, key):
+            return
+        self.static_layer = None
+        self.update()
+
 
 class HotboxReader(QtWidgets.QWidget):
     hideSubmenusRequested = QtCore.Signal()
+    hoveredShapeChanged = QtCore.Signal(object, object)
 
     def __init__(self, hotbox_data, parent=None):
         super(HotboxReader, self).__init__(parent)
@@ -87,31 +177,44 @@ class HotboxReader(QtWidgets.QWidget):
 
         settings = hotbox_data['general']
         self.triggering = settings['triggering']
+        # deferred actions are executed after the hotbox is hidden
+        self.deferred = settings.get('execution', 'immediate') == 'deferred'
         self.aiming = settings['aiming']
         self.is_submenu = settings['submenu']
         self.center = QtCore.QPoint(settings['centerx'], settings['centery'])
         self.setFixedSize(settings['width'], settings['height'])
-        self.shapes = [Shape(data) for data in hotbox_data['shapes']]
+        self.shapes = [
+            Shape(data, asynchronous_image=True)
+            for data in hotbox_data['shapes']]
         self.close_on_leave = settings['leaveclose']
         self.interactive_shapes = [
             s for s in self.shapes if s.is_interactive()]
+        prepare_commands(self.interactive_shapes)
+        # the non interactive shapes are rendered once in a cached layer
+        self.static_shapes, self.dynamic_shapes = split_static_shapes(
+            self.shapes)
+        self.static_layer = None
+        use_sprite_cache = settings.get('spritecache', False)
+        self.sprite_cache = SpriteCache() if use_sprite_cache else None
+        self.index = ShapeIndex(self.interactive_shapes)
+        self.sectors = SectorTable(self.center, self.interactive_shapes)
+        self.hovered_shape = None
+        # shapes waiting for their image by image key
+        self.pending_images = get_pending_images(self.shapes)
+        # last cursor position the aiming line was painted to
+        self.aiming_target = None
 
         self.left_clicked = False
         self.right_clicked = False
+        pixmap_cache.pixmapLoaded.connect(self.image_loaded)
 
     def mouseMoveEvent(self, _):
         self.set_hovered_shapes()
 
     def leaveEvent(self, _):
-        shapes = self.interactive_shapes
-        if self.aiming is True:
-            set_crossed_shapes_hovered(
-                self.center, get_cursor(self), shapes, get_cursor(self))
-        else:
-            set_shapes_hovered(shapes, get_cursor(self), self.clicked)
+        self.set_hovered_shapes()
         if self.close_on_leave is True:
             self.hide()
-        self.repaint()
 
     @property
     def clicked(self):
@@ -130,47 +233,83 @@ class HotboxReader(QtWidgets.QWidget):
             self.right_clicked = True
         elif event.button() == QtCore.Qt.LeftButton:
             self.left_clicked = True
-        for shape in self.shapes:
-            if shape.is_interactive():
-                if shape.hovered and self.clicked:
-                    shape.clicked = True
-                else:
-                    shape.clicked = False
-        self.repaint()
+        self.update_hovered_shape_clicked()
 
     def mouseReleaseEvent(self, event):
-        close = execute_hovered_shape(
-            self.shapes, self.left_clicked, self.right_clicked)
+        close = execute_shape(
+            self.hovered_shape, self.left_clicked, self.right_clicked,
+            deferred=self.deferred)
 
         if event.button() == QtCore.Qt.RightButton:
             self.right_clicked = False
         elif event.button() == QtCore.Qt.LeftButton:
             self.left_clicked = False
 
-        for shape in self.shapes:
-            if shape.is_interactive():
-                shape.clicked = bool(shape.hovered and self.clicked)
+        self.update_hovered_shape_clicked()
 
         if close is True:
             self.hide()
-        self.repaint()
 
-    def paintEvent(self, _):
+    def set_hovered_shape(self, shape):
+        old_shape = self.hovered_shape
+        if shape is old_shape:
+            return
+        self.hovered_shape = shape
+        set_hover_transition(old_shape, shape, self.clicked)
+        self.update_shapes([s for s in (old_shape, shape) if s is not None])
+        self.hoveredShapeChanged.emit(old_shape, shape)
+
+    def update_hovered_shape_clicked(self):
+        shape = self.hovered_shape
+        if shape is None or shape.clicked == self.clicked:
+            return
+        shape.clicked = self.clicked
+        self.update_shapes([shape])
+
+    def update_shapes(self, shapes):
+        for shape in shapes:
+            self.update(shape.bounding_rect())
+
+    def update_aiming(self, target):
+        """ update the area of the previous and of the new aiming line """
+        if self.aiming_target is not None:
+            self.update(get_aiming_rect(self.center, self.aiming_target))
+        self.aiming_target = target
+        if target is not None:
+            self.update(get_aiming_rect(self.center, target))
+
+    def get_static_layer(self):
+        ratio = self.devicePixelRatioF()
+        if not is_layer_valid(self.static_layer, self.size(), ratio):
+            # the aiming background is a workaround because a fully
+            # transparent widget doesn't execute the mouseMove event when the
+            # cursor is hover a transparent of the widget. This draw the
+            # reader rect has black rect with a 1/255 transparency value
+            self.static_layer = render_shapes_layer(
+                self.static_shapes, self.size(), ratio, background=True)
+        return self.static_layer
+
+    def paintEvent(self, event):
+        rect = event.rect()
         painter = QtGui.QPainter()
         painter.begin(self)
         painter.setRenderHint(QtGui.QPainter.Antialiasing)
-        # this is a workaround because a fully transparent widget doesn't
-        # execute the mouseMove event when the cursor is hover a
-        # transparent of the widget. This draw the reader rect has black
-        # rect with a 1/255 transparency value
-        draw_aiming_background(painter, self.rect())
-
-        for shape in self.shapes:
-            shape.draw(painter)
-        if self.aiming:
-            draw_aiming(painter, self.center, get_cursor(self))
+        painter.drawPixmap(0, 0, self.get_static_layer())
+        draw_shapes(painter, self.dynamic_shapes, rect, self.sprite_cache)
+        if self.aiming and self.aiming_target is not None:
+            draw_aiming(painter, self.center, self.aiming_target)
         painter.end()
 
+    def set_sprite_cache_enabled(self, state, max_bytes=None):
+        self.sprite_cache = SpriteCache(max_bytes) if state else None
+        self.update()
+
+    def image_loaded(self, key):
+        if not load_pending_images(self.pending_images, key):
+            return
+        self.static_layer = None
+        self.update()
+
     def show(self):
         self.move(QtGui.QCursor.pos() - self.center)
         super(HotboxReader, self).show()
@@ -182,81 +321,163 @@ class HotboxReader(QtWidgets.QWidget):
             return
 
         if self.triggering == 'click or close':
-            execute_hovered_shape(self.shapes, left=True)
+            execute_shape(
+                self.hovered_shape, left=True, deferred=self.deferred)
         if self.is_submenu is False:
             self.hideSubmenusRequested.emit()
 
         # the shape states for the next hotbox appearance
-        for shape in self.interactive_shapes:
-            shape.hovered = False
-            shape.clicked = False
-        # clean the aiming shape before close
-        self.clear_aiming()
+        shape = self.hovered_shape
+        self.set_hovered_shape(None)
+        # clean the aiming shape and the shape states before close
+        self.clear_aiming([shape] if shape is not None else None)
         super(HotboxReader, self).hide()
 
     def set_hovered_shapes(self):
-        shapes = self.interactive_shapes
+        cursor = get_cursor(self)
         if self.aiming is True:
-            set_crossed_shapes_hovered(
-                self.center, get_cursor(self), shapes, get_cursor(self))
+            shape = get_crossed_shape(cursor, self.index, self.sectors)
+            self.update_aiming(cursor)
         else:
-            set_shapes_hovered(shapes, get_cursor(self), self.clicked)
-        self.repaint()
+            shape = self.index.shape_at(cursor)
+        self.set_hovered_shape(shape)
 
-    def clear_aiming(self):
+    def clear_aiming(self, shapes=None):
         '''
         this method is a workaround because Qt seem optimize to keep a paint
         when a widget is hidden. The aiming shape have to been cleaned before
         the widget is hidden. In case of it's cleaned after, the shape can pop
-        on the next hotbox opening.
+        on the next hotbox opening. The given shapes are repainted in the
+        same pass for the same reason.
         '''
-        if self.aiming is False:
-            return
-        self.aiming = False
-        self.repaint()
-        self.aiming = True
-
-def set_shapes_hovered(shapes, cursor, clicked):
+        region = QtGui.QRegion()
+        for shape in shapes or []:
+            region = region.united(QtGui.QRegion(shape.bounding_rect()))
+        if self.aiming_target is not None:
+            rect = get_aiming_rect(self.center, self.aiming_target)
+            region = region.united(QtGui.QRegion(rect))
+            self.aiming_target = None
+        if not region.isEmpty():
+            self.repaint(region)
+
+
+def split_static_shapes(shapes):
     """
-    this function all the given shapes.
-    It set hovered the shape if his rect contains the cursor.
+    this function split the shapes between the static ones, which can be
+    rendered once in a layer under the others, and the dynamic ones which
+    have to be drawn at each paint. A non interactive shape is static only
+    if it doesn't overlap a dynamic shape below it, otherwise moving it in
+    the bottom layer would change the drawing order.
     """
+    static_shapes = []
+    dynamic_shapes = []
     for shape in shapes:
-        if shape.is_interactive():
-            shape.set_hovered(cursor)
-            shape.clicked = shape.hovered and clicked
+        rect = shape.bounding_rect()
+        overlap = any(
+            rect.intersects(s.bounding_rect()) for s in dynamic_shapes)
+        if shape.is_interactive() or overlap:
+            dynamic_shapes.append(shape)
+        else:
+            static_shapes.append(shape)
+    return static_shapes, dynamic_shapes
+
+
+def get_pending_images(shapes):
+    """ return the shapes waiting for their image by image key """
+    pending_images = {}
+    for shape in shapes:
+        if shape.image_pending:
+            pending_images.setdefault(shape.image_key, []).append(shape)
+    return pending_images
 
 
-def set_crossed_shapes_hovered(point1, point2, shapes, cursor):
+def load_pending_images(pending_images, key):
     """
-    this is the function to set the hovered shape using the aiming system.
-    It filter all shapes crossed by the given line and set the closest to the.
-    cursor hovered.
+    set the pixmap on the shapes waiting for the decoded image key and
+    return them. The other shapes aren't checked.
     """
-    # reset hovered shape
-    for shape in shapes:
-        shape.hovered = False
-    # check first if a shape rect contain the cursor
+    loaded_shapes = []
+    for shape in pending_images.pop(key, []):
+        shape.synchronize_image()
+        if not shape.image_pending:
+            loaded_shapes.append(shape)
+            continue
+        # the image file changed since the request, a new key is decoded.
+        pending_images.setdefault(shape.image_key, []).append(shape)
+    return loaded_shapes
+
+
+def is_layer_valid(layer, size, ratio):
+    if layer is None:
+        return False
+    return layer.devicePixelRatio() == ratio and layer.size() == size * ratio
+
+
+def draw_shapes(painter, shapes, rect, sprite_cache=None):
+    """ draw the shapes intersecting the given rect (the area to repaint) """
     for shape in shapes:
-        if shape.rect.contains(cursor):
-            shape.hovered = True
-            return
+        if not shape.bounding_rect().intersects(rect):
+            continue
+        if sprite_cache is None:
+            shape.draw(painter)
+        else:
+            sprite_cache.draw(painter, shape)
+
+
+def set_hover_transition(old_shape, new_shape, clicked):
+    """
+    this function move the hovered state from the old shape to the new one.
+    The clicked state follow the hovered one.
+    """
+    if old_shape is not None:
+        old_shape.hovered = False
+        old_shape.clicked = False
+    if new_shape is not None:
+        new_shape.hovered = True
+        new_shape.clicked = clicked
+
+
+def get_crossed_shape(cursor, index, sectors):
+    """
+    this is the function to get the hovered shape using the aiming system.
+    It filter all shapes crossed by the line joining the hotbox center and
+    the cursor and return the closest to the cursor.
+    """
+    # check first if a shape rect contain the cursor. As before the index,
+    # the first shape of the list containing it is kept.
+    contained = index.shapes_at(cursor)
+    if contained:
+        return contained[0]
     # filter all shapes crossed by a virtual line who joins the
-    # hotspot and the cursor
-    cshapes = [s for s in shapes if segment_cross_rect(point1, point2, s.rect)]
+    # hotspot and the cursor. The sector table only test the shapes around
+    # the line direction.
+    cshapes = sectors.crossed_shapes(cursor)
     if not cshapes:
-        return
-    # process distance between all shape crossed and
-    # set the closest to the cursor hovered
-    shapedistances = {
-        distance(shape.rect.center(), cursor): shape
-        for shape in cshapes}
-    shapedistances[min(shapedistances.keys())].hovered = True
+        return None
+    # process distance between all shape crossed and set the closest to the
+    # cursor hovered. On equal distances, the topmost shape is kept.
+    return min(
+        cshapes,
+        key=lambda s: (distance(s.rect.center(), cursor), -sectors.zorders[s]))
 
 
-def execute_hovered_shape(shapes, left=False, right=False):
+def prepare_commands(shapes):
+    """
+    prepare the shapes commands when the hotbox is loaded. An invalid code
+    is reported here instead of when the button is clicked.
+    """
     for shape in shapes:
-        if shape.is_interactive() and shape.hovered:
-            shape.execute(left=left, right=right)
-            return shape.autoclose(left=left, right=right)
-    return False
+        try:
+            shape.prepare_commands()
+        except SyntaxError:
+            traceback.print_exc()
+
+
+def execute_shape(shape, left=False, right=False, deferred=False):
+    if shape is None or not shape.is_interactive():
+        return False
+    if deferred is True:
+        action_queue.append(shape, left=left, right=right)
+    else:
+        shape.execute(left=left, right=right)
+    return shape.autoclose(left=left, right=right)
@@ -0,0 +1,125 @@
+from hotbox_designer.reader import HotboxReader
+from hotbox_designer.data import (
+    load_hotboxes_datas, load_json, load_shared_hotboxes_datas,
+    ensure_old_data_compatible, copy_hotbox_data)
+
+
+hotboxes = {}
+# the registry is filled from the files by the first initialize call
+initialized = False
+
+
+def initialize(application, warmup=None):
+    """
+    register the available hotboxes. The readers are built the first time
+    a hotbox is shown, except the ones named in the warmup list which are
+    built immediately.
+    """
+    global initialized
+    if initialized:
+        return
+    load_hotboxes(application, warmup)
+    initialized = True
+
+
+def load_hotboxes(application, warmup=None):
+    hotboxes_datas = load_hotboxes_datas(
+        application.local_file, application.local_storage)
+    links = load_json(application.shared_file, default=[])
+    shared_datas = load_shared_hotboxes_datas(
+        links, mirror_folder=application.shared_mirror_folder)
+    hotboxes_datas += [
+        ensure_old_data_compatible(data)
+        for data in shared_datas if data is not None]
+
+    for hotboxes_data in hotboxes_datas:
+        name = hotboxes_data['general']['name']
+        hotboxes[name] = HotboxDescriptor(hotboxes_data)
+
+    for name in warmup or []:
+        if name in hotboxes:
+            hotboxes[name].get_reader()
+
+
+def clear_loaded_hotboxes():
+    global initialized
+    hotboxes.clear()
+    initialized = False
+
+
+def update_hotbox(hotbox_data, old_name=None):
+    """
+    register the hotbox data in place of the loaded hotbox with the same
+    name (or the old_name given), its reader is rebuilt on the next show.
+    The other hotboxes keep their readers. Before the registry is
+    initialized, there's nothing to update: the hotbox will be loaded
+    from the file by initialize.
+    """
+    if not initialized:
+        return
+    if old_name is not None:
+        hotboxes.pop(old_name, None)
+    hotbox_data = ensure_old_data_compatible(copy_hotbox_data(hotbox_data))
+    hotboxes[hotbox_data['general']['name']] = HotboxDescriptor(hotbox_data)
+
+
+def remove_hotbox(name):
+    hotboxes.pop(name, None)
+
+
+def rename_hotbox(old_name, new_name):
+    descriptor = hotboxes.pop(old_name, None)
+    if descriptor is None:
+        return
+    descriptor.hotbox_data['general']['name'] = new_name
+    hotboxes[new_name] = descriptor
+
+
+def show(name):
+    hotboxes[name].get_reader().show()
+
+
+def hide(name):
+    # a reader not built yet can't be visible
+    reader = hotboxes[name].reader
+    if reader is not None:
+        reader.hide()
+
+
+def switch(name):
+    if hotboxes[name].is_visible():
+        return hide(name)
+    return show(name)
+
+
+def hide_submenus():
+    for name in hotboxes:
+        if hotboxes[name].is_submenu:
+            hide(name)
+
+
+class HotboxDescriptor():
+    """
+    Entry of the hotboxes registry. It only keep the hotbox data until the
+    hotbox is used, the reader and all its shapes are built on demand.
+    """
+    def __init__(self, hotbox_data):
+        self.hotbox_data = hotbox_data
+        self.reader = None
+
+    @property
+    def name(self):
+        return self.hotbox_data['general']['name']
+
+    @property
+    def is_submenu(self):
+        return self.hotbox_data['general']['submenu']
+
+    def is_visible(self):
+        return self.reader is not None and self.reader.isVisible()
+
+    def get_reader(self):
+        if self.reader is None:
+            self.reader = HotboxReader(self.hotbox_data, parent=None)
+            self.reader.hideSubmenusRequested.connect(hide_submenus)
+        return self.reader
@@ -0,0 +1,201 @@
+import math
+from bisect import bisect_right
+from hotbox_designer.geometry import distance, segment_cross_rect
+from hotbox_designer.batchgeometry import (
+    BATCH_THRESHOLD, get_rects_coords, segment_cross_coords)
+
+
+DEFAULT_CELL_SIZE = 32
+MINIMUM_CELL_SIZE = 8
+MAXIMUM_CELL_SIZE = 128
+SECTOR_COUNT = 360
+# tolerance used to avoid to skip a shape cause of float precision.
+EPSILON = 1e-6
+
+
+class ShapeIndex():
+    """
+    Uniform grid over the shapes rects. Each cell store the shapes
+    overlapping it, so a point or rect query only test the few shapes
+    registered in the cells it touches instead of every shape.
+    The z-order is the shapes list order: the last shape is the topmost.
+    If no cell size is given, it is deduced from the shapes sizes to keep
+    a low count of shapes per cell whatever the hotbox density is.
+    """
+    def __init__(self, shapes=None, cell_size=None):
+        self.fixed_cell_size = cell_size
+        self.cell_size = cell_size or DEFAULT_CELL_SIZE
+        self.cells = {}
+        self.shape_cells = {}
+        self.zorders = {}
+        self.top_zorder = -1
+        self.rebuild(shapes or [])
+
+    def rebuild(self, shapes):
+        self.cell_size = self.fixed_cell_size or get_cell_size(shapes)
+        self.cells = {}
+        self.shape_cells = {}
+        self.zorders = {}
+        self.top_zorder = -1
+        for shape in shapes:
+            self.insert(shape)
+
+    def insert(self, shape, zorder=None):
+        """ insert the shape, on top of the others if no z-order is given """
+        if zorder is None:
+            zorder = self.top_zorder + 1
+        self.top_zorder = max(self.top_zorder, zorder)
+        self.zorders[shape] = zorder
+        keys = self._cell_keys(shape.rect)
+        for key in keys:
+            self.cells.setdefault(key, []).append(shape)
+        self.shape_cells[shape] = keys
+
+    def remove(self, shape):
+        for key in self.shape_cells.pop(shape, []):
+            cell = self.cells[key]
+            cell.remove(shape)
+            if not cell:
+                del self.cells[key]
+        self.zorders.pop(shape, None)
+
+    def update(self, shape):
+        """ update the cells of a moved or resized shape """
+        zorder = self.zorders[shape]
+        self.remove(shape)
+        self.insert(shape, zorder)
+
+    def __contains__(self, shape):
+        return shape in self.zorders
+
+    def __len__(self):
+        return len(self.zorders)
+
+    def shape_at(self, point):
+        """ return the topmost shape containing the point or None """
+        shape_at = None
+        zorder = -1
+        for shape in self.cells.get(self._cell_key(point.x(), point.y()), []):
+            if self.zorders[shape] > zorder and shape.rect.contains(point):
+                shape_at = shape
+                zorder = self.zorders[shape]
+        return shape_at
+
+    def shapes_at(self, point):
+        """ return all the shapes containing the point sorted by z-order """
+        key = self._cell_key(point.x(), point.y())
+        shapes = [s for s in self.cells.get(key, []) if s.rect.contains(point)]
+        return sorted(shapes, key=self.zorders.get)
+
+    def shapes_in(self, rect):
+        """ return all the shapes intersecting the rect sorted by z-order """
+        candidates = set()
+        for key in self._cell_keys(rect):
+            candidates.update(self.cells.get(key, []))
+        shapes = [s for s in candidates if s.rect.intersects(rect)]
+        return sorted(shapes, key=self.zorders.get)
+
+    def _cell_key(self, x, y):
+        return (
+            int(math.floor(x / self.cell_size)),
+            int(math.floor(y / self.cell_size)))
+
+    def _cell_keys(self, rect):
+        left, top = self._cell_key(
+            min(rect.left(), rect.right()), min(rect.top(), rect.bottom()))
+        right, bottom = self._cell_key(
+            max(rect.left(), rect.right()), max(rect.top(), rect.bottom()))
+        return [
+            (column, row)
+            for column in range(left, right + 1)
+            for row in range(top, bottom + 1)]
+
+
+class SectorTable():
+    """
+    Angular lookup table around a fixed center (the hotbox center).
+    Each sector store the shapes a ray going through this sector can cross,
+    sorted by their distance to the center. Finding the shapes crossed by
+    the aiming segment only need to scan the sector under the cursor until
+    the shapes are farther than the cursor.
+    """
+    def __init__(self, center, shapes, sector_count=SECTOR_COUNT):
+        self.center = center
+        self.sector_count = sector_count
+        self.step = (math.pi * 2) / sector_count
+        self.zorders = {}
+        self.sectors = [[] for _ in range(sector_count)]
+        for zorder, shape in enumerate(shapes):
+            self.zorders[shape] = zorder
+            near = get_rect_distance(center, shape.rect)
+            for sector in self._rect_sectors(shape.rect):
+                self.sectors[sector].append((near, zorder, shape))
+        for sector in self.sectors:
+            sector.sort(key=lambda item: (item[0], item[1]))
+        self.nears = [[item[0] for item in s] for s in self.sectors]
+        # the crowded sectors are tested in batch
+        self.coords = [
+            get_rects_coords([item[2].rect for item in s])
+            if len(s) >= BATCH_THRESHOLD else None
+            for s in self.sectors]
+
+    def crossed_shapes(self, cursor):
+        """
+        return the shapes crossed by the segment joining the center and the
+        cursor, sorted by distance to the center.
+        """
+        length = distance(self.center, cursor) + EPSILON
+        index = self._sector(cursor.x(), cursor.y())
+        sector = self.sectors[index]
+        # only the shapes closer than the cursor can be crossed
+        count = bisect_right(self.nears[index], length)
+        if count >= BATCH_THRESHOLD:
+            crossed = segment_cross_coords(
+                self.center, cursor, self.coords[index][:count])
+            return [item[2] for item, c in zip(sector, crossed) if c]
+        return [
+            shape for _, _, shape in sector[:count]
+            if segment_cross_rect(self.center, cursor, shape.rect)]
+
+    def _sector(self, x, y):
+        angle = math.atan2(y - self.center.y(), x - self.center.x())
+        return int(math.floor(angle / self.step)) % self.sector_count
+
+    def _rect_sectors(self, rect):
+        if rect.contains(self.center):
+            return range(self.sector_count)
+        cx, cy = self.center.x(), self.center.y()
+        reference = math.atan2(rect.center().y() - cy, rect.center().x() - cx)
+        corners = (
+            rect.topLeft(), rect.topRight(),
+            rect.bottomLeft(), rect.bottomRight())
+        deltas = []
+        for corner in corners:
+            angle = math.atan2(corner.y() - cy, corner.x() - cx) - reference
+            # normalize the angle difference between -pi and pi
+            deltas.append(math.atan2(math.sin(angle), math.cos(angle)))
+        # extra sector on each side for float precision safety
+        first = int(math.floor((reference + min(deltas)) / self.step)) - 1
+        last = int(math.floor((reference + max(deltas)) / self.step)) + 1
+        if last - first >= self.sector_count:
+            return range(self.sector_count)
+        return [i % self.sector_count for i in range(first, last + 1)]
+
+
+def get_rect_distance(point, rect):
+    """ return the distance between a point and the closest rect point """
+    left, right = sorted((rect.left(), rect.right()))
+    top, bottom = sorted((rect.top(), rect.bottom()))
+    x = max(left - point.x(), 0, point.x() - right)
+    y = max(top - point.y(), 0, point.y() - bottom)
+    return math.sqrt(x ** 2 + y ** 2)
+
+
+def get_cell_size(shapes):
+    """ return the median shape dimension clamped in the cell size range """
+    if not shapes:
+        return DEFAULT_CELL_SIZE
+    sizes = sorted(
+        (abs(s.rect.width()) + abs(s.rect.height())) / 2.0 for s in shapes)
+    size = sizes[len(sizes) // 2]
+    return max(MINIMUM_CELL_SIZE, min(MAXIMUM_CELL_SIZE, size))
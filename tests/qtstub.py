@@ -0,0 +1,44 @@
+"""
+Import-only stand-in for a Qt binding, used by the import test when no
+binding is installed. Every Qt class is a permissive placeholder that can
+be subclassed, anything else is a mock: the modules can be imported,
+nothing is drawn.
+"""
+import sys
+import types
+from unittest import mock
+
+
+class Placeholder(object):
+    """ accept any construction and any call, does nothing """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        value = mock.MagicMock(name=name)
+        setattr(self, name, value)
+        return value
+
+
+class StubModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name[0] == 'Q' and name[1:2].isupper():
+            value = type(name, (Placeholder,), {})
+        else:
+            value = mock.MagicMock(name=name)
+        setattr(self, name, value)
+        return value
+
+
+def install():
+    """ register the stub as the binding used by hotbox_designer """
+    qt = types.ModuleType('hotbox_designer.vendor.Qt')
+    qt.QtCore = StubModule('QtCore')
+    qt.QtGui = StubModule('QtGui')
+    qt.QtWidgets = StubModule('QtWidgets')
+    sys.modules['hotbox_designer.vendor.Qt'] = qt
+    return qt
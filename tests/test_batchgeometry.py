@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+# the numpy code path is compared with the pure python fallback
+try:
+    import numpy
+except ImportError:
+    pytest.skip('numpy is not installed', allow_module_level=True)
+# the hotbox_designer package imports the reader, which needs Qt
+try:
+    from hotbox_designer.vendor.Qt import QtCore
+except ImportError:
+    pytest.skip('A Qt binding is required', allow_module_level=True)
+
+from hotbox_designer import batchgeometry
+from hotbox_designer.data import ensure_old_data_compatible
+from hotbox_designer.interactive import get_shape_rect_from_options
+
+
+TEMPLATES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'hotbox_designer', 'resources', 'templates')
+# distance between two segment ends tested
+CURSOR_STEP = 25
+
+
+def load_template(filename):
+    with open(os.path.join(TEMPLATES, filename), 'r') as f:
+        return ensure_old_data_compatible(json.load(f))
+
+
+def get_rects(hotbox_data):
+    return [get_shape_rect_from_options(o) for o in hotbox_data['shapes']]
+
+
+def without_numpy(monkeypatch, function, *args):
+    """ call the function with the pure python fallback """
+    with monkeypatch.context() as context:
+        context.setattr(batchgeometry, 'numpy', None)
+        return function(*args)
+
+
+@pytest.fixture(params=sorted(os.listdir(TEMPLATES)))
+def hotbox_data(request):
+    return load_template(request.param)
+
+
+def test_coords_and_bounds(monkeypatch, hotbox_data):
+    rects = get_rects(hotbox_data)
+    array = batchgeometry.get_rects_coords(rects)
+    coords = without_numpy(monkeypatch, batchgeometry.get_rects_coords, rects)
+    assert array.tolist() == [list(c) for c in coords]
+    bounds = without_numpy(
+        monkeypatch, batchgeometry.get_coords_bounds, coords)
+    assert tuple(batchgeometry.get_coords_bounds(array)) == bounds
+
+
+def test_remap_coords(monkeypatch, hotbox_data):
+    rects = get_rects(hotbox_data)
+    array = batchgeometry.get_rects_coords(rects)
+    coords = without_numpy(monkeypatch, batchgeometry.get_rects_coords, rects)
+    in_reference = QtCore.QRectF()
+    in_reference.setCoords(*batchgeometry.get_coords_bounds(array))
+    out_reference = in_reference.adjusted(-13.5, 7, 40.25, 91)
+    remapped = without_numpy(
+        monkeypatch, batchgeometry.remap_coords,
+        coords, in_reference, out_reference)
+    remapped_array = batchgeometry.remap_coords(
+        array, in_reference, out_reference)
+    assert numpy.allclose(remapped_array, numpy.array(remapped))
+
+
+def test_segment_cross_coords(monkeypatch, hotbox_data):
+    settings = hotbox_data['general']
+    center = QtCore.QPoint(settings['centerx'], settings['centery'])
+    rects = get_rects(hotbox_data)
+    array = batchgeometry.get_rects_coords(rects)
+    coords = without_numpy(monkeypatch, batchgeometry.get_rects_coords, rects)
+    for x in range(0, settings['width'], CURSOR_STEP):
+        for y in range(0, settings['height'], CURSOR_STEP):
+            cursor = QtCore.QPoint(x, y)
+            crossed = without_numpy(
+                monkeypatch, batchgeometry.segment_cross_coords,
+                center, cursor, coords)
+            crossed_array = batchgeometry.segment_cross_coords(
+                center, cursor, array)
+            assert crossed_array.tolist() == crossed, (x, y)
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+# the hotbox_designer package imports the reader, which needs Qt
+try:
+    from hotbox_designer.vendor.Qt import QtCore  # noqa: F401
+except ImportError:
+    pytest.skip('A Qt binding is required', allow_module_level=True)
+
+from hotbox_designer import templates
+from hotbox_designer.data import (
+    encode_hotbox_data, ensure_old_data_compatible, copy_hotbox_data)
+
+
+TEMPLATES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'hotbox_designer', 'resources', 'templates')
+
+
+def round_trip(data):
+    text = json.dumps(encode_hotbox_data(copy_hotbox_data(data)))
+    return ensure_old_data_compatible(json.loads(text))
+
+
+def assert_same_options(options1, options2):
+    assert options1 == options2
+    for key, value in options1.items():
+        assert type(value) is type(options2[key]), key
+
+
+@pytest.mark.parametrize('filename', sorted(os.listdir(TEMPLATES)))
+def test_templates_round_trip(filename):
+    with open(os.path.join(TEMPLATES, filename), 'r') as f:
+        data = ensure_old_data_compatible(json.load(f))
+    decoded = round_trip(data)
+    assert decoded['general'] == data['general']
+    assert len(decoded['shapes']) == len(data['shapes'])
+    for options1, options2 in zip(decoded['shapes'], data['shapes']):
+        assert_same_options(options1, options2)
+
+
+def test_round_trip_keeps_value_types():
+    options = templates.SQUARE_BUTTON.copy()
+    # equal to the template values, but not of the same type
+    options['text.size'] = 12.0
+    options['borderwidth.clicked'] = 2.0
+    options['bgcolor.transparency'] = False
+    options['action.left'] = 1
+    data = {'general': templates.HOTBOX.copy(), 'shapes': [options]}
+    assert_same_options(round_trip(data)['shapes'][0], options)
+
+
+def test_decoding_ignores_current_templates(monkeypatch):
+    data = {'general': templates.HOTBOX.copy(), 'shapes': [
+        templates.SQUARE_BUTTON.copy()]}
+    encoded = json.dumps(encode_hotbox_data(data))
+    # a new default for the created shapes doesn't change the saved ones
+    monkeypatch.setitem(templates.SQUARE_BUTTON, 'bgcolor.normal', '#FF0000')
+    decoded = ensure_old_data_compatible(json.loads(encoded))
+    assert decoded['shapes'][0]['bgcolor.normal'] == '#888888'
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TESTS)
+# maximum cumulative import time of the hotbox_designer package, in
+# microseconds, without the Qt binding and numpy (used by the batchgeometry
+# module when it's installed). It measures about 40 ms with the stub and
+# 60 ms with PySide6, the budget leaves a margin for slower machines.
+IMPORT_TIME_BUDGET = 120000
+# optional third party modules not counted in the import time
+EXTERNAL_MODULES = 'hotbox_designer.vendor.Qt', 'numpy'
+# modules only needed by the manager and the editor
+EDITOR_MODULES = (
+    'hotbox_designer.designer',
+    'hotbox_designer.manager',
+    'hotbox_designer.dialog',
+    'hotbox_designer.widgets',
+    'hotbox_designer.colorwheel')
+IMPORT_CODE = """
+import sys
+if sys.argv[1] == 'stub':
+    import qtstub
+    qtstub.install()
+import hotbox_designer
+print('\\n'.join(sorted(sys.modules)))
+"""
+
+
+def run_import(binding):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([TESTS, ROOT])
+    return subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', IMPORT_CODE, binding],
+        env=env, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+
+
+def import_hotbox_designer():
+    """
+    return the loaded modules and the import times in a new process. The
+    installed Qt binding is used, the stub only when there's none.
+    """
+    process = run_import('binding')
+    if process.returncode and 'No Qt binding' in process.stderr:
+        process = run_import('stub')
+    assert process.returncode == 0, process.stderr
+    modules = process.stdout.split()
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return modules, times
+
+
+def test_runtime_import_excludes_editor_modules():
+    modules, _ = import_hotbox_designer()
+    loaded = [
+        module for module in modules
+        if any(
+            module == name or module.startswith(name + '.')
+            for name in EDITOR_MODULES)]
+    assert not loaded
+
+
+def test_runtime_import_time_budget():
+    _, times = import_hotbox_designer()
+    duration = times['hotbox_designer'] - sum(
+        times.get(name, 0) for name in EXTERNAL_MODULES)
+    assert duration < IMPORT_TIME_BUDGET
@@ -0,0 +1,97 @@
+import json
+import os
+
+import pytest
+
+# the geometry is compared with the real Qt rects semantics
+try:
+    from hotbox_designer.vendor.Qt import QtCore
+except ImportError:
+    pytest.skip('A Qt binding is required', allow_module_level=True)
+
+from hotbox_designer.data import ensure_old_data_compatible
+from hotbox_designer.geometry import distance, segment_cross_rect
+from hotbox_designer.interactive import get_shape_rect_from_options
+from hotbox_designer.reader import get_crossed_shape
+from hotbox_designer.spatial import ShapeIndex, SectorTable
+
+
+TEMPLATES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'hotbox_designer', 'resources', 'templates')
+AIMING_TEMPLATES = 'marking1.json', 'marking2.json', 'cross.json'
+# distance between two cursor positions tested
+CURSOR_STEP = 6
+
+
+class RectShape():
+    def __init__(self, options):
+        self.rect = get_shape_rect_from_options(options)
+
+
+def load_template(filename):
+    with open(os.path.join(TEMPLATES, filename), 'r') as f:
+        return ensure_old_data_compatible(json.load(f))
+
+
+def get_interactive_shapes(hotbox_data):
+    return [
+        RectShape(options) for options in hotbox_data['shapes']
+        if options['action.left'] or options['action.right']]
+
+
+def get_crossed_shape_brute_force(cursor, shapes, crossed):
+    """
+    aiming lookup as done by set_crossed_shapes_hovered before the index and
+    the sector table: the first shape of the list containing the cursor,
+    else the crossed shape the closest to the cursor.
+    """
+    for shape in shapes:
+        if shape.rect.contains(cursor):
+            return shape
+    if not crossed:
+        return None
+    # on equal distances, the last shape (the topmost) is kept
+    distances = {distance(s.rect.center(), cursor): s for s in crossed}
+    return distances[min(distances)]
+
+
+@pytest.mark.parametrize('filename', AIMING_TEMPLATES)
+def test_sector_table_matches_brute_force(filename):
+    hotbox_data = load_template(filename)
+    settings = hotbox_data['general']
+    center = QtCore.QPoint(settings['centerx'], settings['centery'])
+    shapes = get_interactive_shapes(hotbox_data)
+    index = ShapeIndex(shapes)
+    sectors = SectorTable(center, shapes)
+    assert shapes
+
+    mismatches = []
+    for x in range(0, settings['width'], CURSOR_STEP):
+        for y in range(0, settings['height'], CURSOR_STEP):
+            cursor = QtCore.QPoint(x, y)
+            crossed = [
+                s for s in shapes
+                if segment_cross_rect(center, cursor, s.rect)]
+            if set(sectors.crossed_shapes(cursor)) != set(crossed):
+                mismatches.append(('crossed', x, y))
+            expected = get_crossed_shape_brute_force(cursor, shapes, crossed)
+            if get_crossed_shape(cursor, index, sectors) is not expected:
+                mismatches.append(('hovered', x, y))
+    assert not mismatches, mismatches[:10]
+
+
+def test_crossed_shape_keeps_first_containing_shape():
+    # overlapping buttons: the first of the list wins, as before the index
+    shapes = [
+        RectShape({'shape.left': 0, 'shape.top': 0,
+                   'shape.width': 40, 'shape.height': 40}),
+        RectShape({'shape.left': 20, 'shape.top': 20,
+                   'shape.width': 40, 'shape.height': 40})]
+    center = QtCore.QPoint(100, 100)
+    index = ShapeIndex(shapes)
+    sectors = SectorTable(center, shapes)
+    cursor = QtCore.QPoint(30, 30)
+    expected = get_crossed_shape_brute_force(cursor, shapes, [])
+    assert expected is shapes[0]
+    assert get_crossed_shape(cursor, index, sectors) is expected
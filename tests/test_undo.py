@@ -0,0 +1,188 @@
+import os
+import pickle
+
+import pytest
+
+# the hotbox_designer package imports the reader, which needs Qt
+try:
+    from hotbox_designer.vendor.Qt import QtCore  # noqa: F401
+except ImportError:
+    pytest.skip('A Qt binding is required', allow_module_level=True)
+
+from hotbox_designer.data import copy_hotbox_data
+from hotbox_designer.designer.undo import (
+    UndoManager, SpilledStack, MISSING, get_changes)
+
+
+def get_shape(name, **options):
+    shape = {'text.content': name, 'shape.left': 0, 'shape.top': 0}
+    shape.update(options)
+    return shape
+
+
+def get_hotbox(shapes):
+    return {'general': {'name': 'hotbox', 'width': 100}, 'shapes': shapes}
+
+
+def delete_shapes(data, uids, deleted):
+    shapes = [s for s, uid in zip(data['shapes'], uids) if uid not in deleted]
+    return get_hotbox(shapes), [uid for uid in uids if uid not in deleted]
+
+
+def get_edits():
+    """ return the successive (data, uids) of an editing session """
+    states = []
+    uids = ['a', 'b', 'c']
+    data = get_hotbox([get_shape('a'), get_shape('b'), get_shape('c')])
+    states.append((data, uids))
+    # insert in the middle and at the end
+    data = copy_hotbox_data(data)
+    data['shapes'][1:1] = [get_shape('d')]
+    data['shapes'].append(get_shape('e'))
+    uids = ['a', 'd', 'b', 'c', 'e']
+    states.append((data, uids))
+    # delete the first and a middle shape
+    data, uids = delete_shapes(copy_hotbox_data(data), uids, ('a', 'b'))
+    states.append((data, uids))
+    # reorder
+    data = copy_hotbox_data(data)
+    data['shapes'].reverse()
+    uids = uids[::-1]
+    states.append((data, uids))
+    # remove an option, add another one and modify the general options
+    data = copy_hotbox_data(data)
+    del data['shapes'][0]['shape.top']
+    data['shapes'][1]['image.path'] = 'icon.png'
+    data['general']['width'] = 200
+    states.append((data, uids))
+    # insert, delete and reorder in one edit
+    data = copy_hotbox_data(data)
+    shapes = dict(zip(uids, data['shapes']))
+    uids = ['f', 'c', 'e', 'g']
+    shapes.update({'f': get_shape('f'), 'g': get_shape('g')})
+    data['shapes'] = [shapes[uid] for uid in uids]
+    states.append((data, uids))
+    return states
+
+
+def assert_state(manager, data, uids):
+    assert manager.data == data
+    assert [uid for uid, _ in manager.shapes()] == uids
+
+
+@pytest.mark.parametrize('depth', (None, 2))
+def test_undo_redo_restore_snapshots(depth):
+    states = get_edits()
+    manager = UndoManager(*states[0], depth=depth)
+    for data, uids in states[1:]:
+        manager.set_data_modified(copy_hotbox_data(data), uids)
+        assert_state(manager, data, uids)
+
+    for data, uids in reversed(states[:-1]):
+        assert manager.undo()
+        assert_state(manager, data, uids)
+    assert not manager.undo()
+
+    for data, uids in states[1:]:
+        assert manager.redo()
+        assert_state(manager, data, uids)
+    assert not manager.redo()
+
+
+def test_changes_are_positional():
+    old_shapes = {uid: get_shape(uid) for uid in 'abc'}
+    new_uids = ['d', 'a', 'c', 'e']
+    new_shapes = [get_shape(uid) for uid in new_uids]
+    changes = get_changes(
+        {}, list('abc'), old_shapes, {}, new_uids, new_shapes)
+    assert changes['inserted'] == {
+        'd': (0, get_shape('d')), 'e': (3, get_shape('e'))}
+    assert changes['deleted'] == {'b': (1, get_shape('b'))}
+    # the kept shapes are still in the same order
+    assert 'order' not in changes
+
+
+def test_order_change_is_recorded():
+    old_shapes = {uid: get_shape(uid) for uid in 'abc'}
+    new_uids = ['c', 'a', 'b']
+    new_shapes = [get_shape(uid) for uid in new_uids]
+    changes = get_changes(
+        {}, list('abc'), old_shapes, {}, new_uids, new_shapes)
+    assert changes == {'order': (('a', 'b', 'c'), ('c', 'a', 'b'))}
+
+
+def test_missing_option_round_trip():
+    old_shapes = {'a': get_shape('a')}
+    new_shapes = [get_shape('a', **{'image.path': 'icon.png'})]
+    del new_shapes[0]['shape.top']
+    changes = get_changes({}, ['a'], old_shapes, {}, ['a'], new_shapes)
+    assert changes['options']['a'] == {
+        'shape.top': (0, MISSING), 'image.path': (MISSING, 'icon.png')}
+    copied = pickle.loads(pickle.dumps(changes, pickle.HIGHEST_PROTOCOL))
+    assert copied['options']['a']['shape.top'][1] is MISSING
+    assert copied['options']['a']['image.path'][0] is MISSING
+
+
+def test_reset_stacks_keeps_saved_state():
+    manager = UndoManager(get_hotbox([get_shape('a')]), ['a'])
+    data = get_hotbox([get_shape('b')])
+    manager.set_data_modified(copy_hotbox_data(data), ['b'])
+    manager.reset_stacks(data, ['b'])
+    assert not manager.data_saved
+    assert not manager.undo()
+    assert_state(manager, data, ['b'])
+
+
+def test_spilled_stack_overflow():
+    stack = SpilledStack(depth=3)
+    for i in range(10):
+        stack.append({'index': i, 'option': MISSING})
+    assert len(stack) == 10
+    assert stack.spilled_count == 7
+    records = [stack.pop() for _ in range(10)]
+    assert [r['index'] for r in records] == list(range(9, -1, -1))
+    assert all(r['option'] is MISSING for r in records)
+    assert not stack
+
+
+def test_spilled_stack_append_after_unspill():
+    stack = SpilledStack(depth=2)
+    for i in range(6):
+        stack.append(i)
+    # pop past the memory part, the spilled records are read back
+    assert [stack.pop() for _ in range(4)] == [5, 4, 3, 2]
+    stack.append(6)
+    stack.append(7)
+    stack.append(8)
+    assert [stack.pop() for _ in range(len(stack))] == [8, 7, 6, 1, 0]
+
+
+def test_undo_past_spilled_boundary():
+    states = get_edits()
+    manager = UndoManager(*states[0], depth=1)
+    for data, uids in states[1:]:
+        manager.set_data_modified(copy_hotbox_data(data), uids)
+    assert manager._undo_stack.spilled_count == len(states) - 2
+    for data, uids in reversed(states[:-1]):
+        assert manager.undo()
+        assert_state(manager, data, uids)
+    assert manager._redo_stack.spilled_count == len(states) - 2
+
+
+def test_spilled_stack_clear_closes_file():
+    stack = SpilledStack(depth=1)
+    for i in range(3):
+        stack.append(i)
+    spill_file = stack._file
+    assert spill_file is not None
+    stack.clear()
+    assert spill_file.closed
+    # the file has no name where it's unlinked right away (posix)
+    if isinstance(spill_file.name, str):
+        assert not os.path.exists(spill_file.name)
+    assert stack._file is None
+    assert not stack
+    # the stack is still usable
+    for i in range(3):
+        stack.append(i)
+    assert [stack.pop() for _ in range(3)] == [2, 1, 0]